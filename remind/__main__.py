@@ -0,0 +1,5 @@
+import sys
+
+from remind.cli import main
+
+sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+ReMind command line.
+
+    python -m remind ingest notes/ --urls urls.txt --playlist PLxxxxxxxx --workers 4
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import List
+
+import dotenv
+
+dotenv.load_dotenv()
+
+from loguru import logger
+
+from remind.database.mongodb import collection_count
+from remind.domain.jobs import IngestionJob
+from remind.domain.notes import Asset, SourceEmbedding, file_fingerprint
+from remind.graphs.utils import token_count
+from remind.process_content.file_to_text import SUPPORTED_EXTENSIONS
+from remind.process_content.ingestion import (INGEST_WORKERS,
+                                              IngestionWorkerPool,
+                                              is_already_ingested,
+                                              submit_ingestion_job,
+                                              wait_for_jobs)
+from remind.process_content.youtube_to_text import get_playlist_video_urls
+
+
+def collect_files(paths: List[str], pattern: str) -> List[str]:
+    """ Expand directories with the glob pattern and keep the files that can be converted. """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            candidates = sorted(file for file in path.glob(pattern) if file.is_file())
+        elif path.is_file():
+            candidates = [path]
+        else:
+            logger.warning(f"{path} does not exist")
+            continue
+        files.extend(
+            str(file.resolve()) for file in candidates
+            if file.suffix.lstrip(".").lower() in SUPPORTED_EXTENSIONS
+        )
+    return list(dict.fromkeys(files))
+
+
+def read_url_lists(url_files: List[str]) -> List[str]:
+    """ Read URLs from text files, one per line. Blank lines and lines starting with # are skipped. """
+    urls = []
+    for url_file in url_files:
+        with open(url_file, "r", encoding="utf-8") as f:
+            urls.extend(
+                line.strip() for line in f
+                if line.strip() and not line.lstrip().startswith("#")
+            )
+    return urls
+
+
+def print_summary(jobs: List[IngestionJob], skipped: int, elapsed: float) -> None:
+    done = [job for job in jobs if job.status == "done" and not job.duplicate_of]
+    duplicates = [job for job in jobs if job.status == "done" and job.duplicate_of]
+    failed = [job for job in jobs if job.status == "failed"]
+    chunks = collection_count(
+        SourceEmbedding.table_name, {"source_id": {"$in": [job.source_id for job in done]}}
+    )
+    tokens = sum(token_count(job.full_text) for job in done if job.full_text)
+    elapsed = max(elapsed, 1e-9)
+    print(f"Ingested {len(done)} documents in {elapsed:.1f}s ({len(failed)} failed, {skipped + len(duplicates)} skipped)")
+    print(f"{len(done) / elapsed:.3f} docs/s, {chunks / elapsed:.2f} chunks/s, {tokens / elapsed:.1f} tokens/s")
+    for job in failed:
+        print(f"Failed: {job.display_name}: {job.error}")
+
+
+def ingest(args) -> int:
+    files = collect_files(args.paths, args.glob)
+    urls = read_url_lists(args.urls)
+    for playlist in args.playlist:
+        urls.extend(get_playlist_video_urls(playlist))
+    urls = list(dict.fromkeys(urls))
+
+    items = [
+        dict(input_path=file, asset=Asset(file_path=file, file_hash=file_fingerprint(file)))
+        for file in files
+    ]
+    items += [dict(asset=Asset(url=url)) for url in urls]
+
+    jobs = []
+    skipped = 0
+    for item in items:
+        asset: Asset = item["asset"]
+        if is_already_ingested(asset):
+            skipped += 1
+            continue
+        # Without the AI transforms, name the note after its file or URL
+        title = None if args.transform else (Path(asset.file_path).stem if asset.file_path else asset.url)
+        jobs.append(submit_ingestion_job(title=title, transform=args.transform, **item))
+    logger.info(f"Queued {len(jobs)} items, skipped {skipped} already ingested")
+
+    if not jobs or args.queue_only:
+        return 0
+
+    workers = IngestionWorkerPool(num_workers=args.workers)
+    start = time.perf_counter()
+    workers.start()
+    try:
+        finished = wait_for_jobs([job.id for job in jobs])
+    except KeyboardInterrupt:
+        logger.warning("Interrupted. Unfinished jobs are picked up again by the next running workers.")
+        return 130
+    elapsed = time.perf_counter() - start
+    workers.stop()
+
+    print_summary(finished, skipped, elapsed)
+    return 1 if any(job.status == "failed" for job in finished) else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="remind")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Convert, transform and save notes in bulk")
+    ingest_parser.add_argument("paths", nargs="*", help="Files or directories to ingest")
+    ingest_parser.add_argument("--glob", default="**/*", help="Pattern of files to ingest in directories (default: %(default)s)")
+    ingest_parser.add_argument("--urls", action="append", default=[], metavar="FILE", help="Text file of webpage or YouTube URLs, one per line")
+    ingest_parser.add_argument("--playlist", action="append", default=[], metavar="ID", help="YouTube playlist id or URL")
+    ingest_parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Number of ingestion workers (default: %(default)s)")
+    ingest_parser.add_argument("--transform", action=argparse.BooleanOptionalAction, default=True, help="Generate title, topics and transformations with AI")
+    ingest_parser.add_argument("--queue-only", action="store_true", help="Only queue the items for the workers of the WebUI")
+    ingest_parser.set_defaults(func=ingest)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
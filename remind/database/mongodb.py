@@ -1,28 +1,160 @@
+import atexit
 import os
+import threading
 from contextlib import contextmanager
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from loguru import logger
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.monitoring import ConnectionPoolListener
 from pymongo.operations import SearchIndexModel
 
 
+class PoolStatsListener(ConnectionPoolListener):
+    """ Count connection pool events so that connection churn can be observed. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {
+            "pools_created": 0,
+            "pools_cleared": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkins": 0,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.stats = self._empty_stats()
+
+    def reset_after_fork(self):
+        # The lock may have been held by another thread at fork time: replace it instead of acquiring it
+        self._lock = threading.Lock()
+        self.stats = self._empty_stats()
+
+    def _incr(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def pool_created(self, event):
+        self._incr("pools_created")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._incr("checkouts")
+
+    def connection_checked_in(self, event):
+        self._incr("checkins")
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["connections_open"] = stats["connections_created"] - stats["connections_closed"]
+        stats["checked_out"] = stats["checkouts"] - stats["checkins"]
+        return stats
+
+
+_client: Optional[MongoClient] = None
+_client_lock = threading.Lock()
+_pool_stats = PoolStatsListener()
+
+
+def _client_options() -> Dict[str, Any]:
+    """ Read the connection pool configuration from the environment. """
+    return dict(
+        maxPoolSize=int(os.environ.get("MONGO_MAX_POOL_SIZE", 50)),
+        minPoolSize=int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+        maxIdleTimeMS=int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 300_000)),
+        connectTimeoutMS=int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 20_000)),
+        serverSelectionTimeoutMS=int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30_000)),
+        waitQueueTimeoutMS=int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 30_000)),
+    )
+
+
+def get_client() -> MongoClient:
+    """
+    Get the process-wide MongoClient. The client is thread-safe and keeps its own
+    connection pool, so it is created once and shared by every database helper.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(
+                    host=os.environ["MONGO_HOST"],
+                    event_listeners=[_pool_stats],
+                    **_client_options(),
+                )
+                logger.debug("Created pooled MongoClient")
+    return _client
+
+
+def close_client() -> None:
+    """ Close the shared MongoClient. A new one is created on next use. """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _reset_client_after_fork() -> None:
+    # MongoClient is not fork-safe: drop the parent's client without closing its sockets.
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+    _pool_stats.reset_after_fork()
+
+
+def pool_stats() -> Dict[str, int]:
+    """ Get connection pool statistics of the shared MongoClient. """
+    return _pool_stats.snapshot()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_client_after_fork)
+atexit.register(close_client)
+
+
 @contextmanager
 def db_connection():
-    connection = MongoClient(
-        host=os.environ["MONGO_HOST"],
-    )
-    try:
-        yield connection[os.environ["MONGO_DATABASE"]]
-    finally:
-        connection.close()
+    yield get_client()[os.environ["MONGO_DATABASE"]]
 
 
-def collection_query(collection_name: str, filter: Dict[str, Any]):
+def collection_query(collection_name: str, filter: Dict[str, Any], projection: Optional[Dict[str, Any]] = None):
     with db_connection() as db:
         try:
             collection = db[collection_name]
-            result = collection.find(filter)
+            result = collection.find(filter, projection)
             return list(result)
         except Exception as e:
             logger.critical(f"Query filter: {filter}")
@@ -30,6 +162,11 @@ def collection_query(collection_name: str, filter: Dict[str, Any]):
             raise
 
 
+def collection_count(collection_name: str, filter: Dict[str, Any]) -> int:
+    with db_connection() as db:
+        return db[collection_name].count_documents(filter)
+
+
 def collection_create(collection_name: str, data: Dict[str, Any]):
     with db_connection() as db:
         collection = db[collection_name]
@@ -37,6 +174,28 @@ def collection_create(collection_name: str, data: Dict[str, Any]):
         return result.inserted_id
 
 
+def collection_insert_many(collection_name: str, data: List[Dict[str, Any]], batch_size: int = 1000) -> List[Any]:
+    """ Insert documents in unordered batches and return their ids in input order. """
+    inserted_ids = []
+    with db_connection() as db:
+        collection = db[collection_name]
+        for i in range(0, len(data), batch_size):
+            result = collection.insert_many(data[i:i + batch_size], ordered=False)
+            inserted_ids.extend(result.inserted_ids)
+    return inserted_ids
+
+
+def collection_bulk_write(collection_name: str, operations: List[Any], batch_size: int = 1000) -> int:
+    """ Run write operations in unordered batches and return the number of modified documents. """
+    modified_count = 0
+    with db_connection() as db:
+        collection = db[collection_name]
+        for i in range(0, len(operations), batch_size):
+            result = collection.bulk_write(operations[i:i + batch_size], ordered=False)
+            modified_count += result.modified_count
+    return modified_count
+
+
 def collection_upsert(collection_name: str, filter: Dict[str, Any], data: Dict[str, Any]):
     with db_connection() as db:
         collection = db[collection_name]
@@ -51,6 +210,27 @@ def collection_update(collection_name: str, filter: Dict[str, Any], data: Dict[s
         return result.modified_count
 
 
+def collection_update_many(collection_name: str, filter: Dict[str, Any], update: Dict[str, Any]):
+    with db_connection() as db:
+        collection = db[collection_name]
+        result = collection.update_many(filter, update)
+        return result.modified_count
+
+
+def collection_find_one_and_update(
+    collection_name: str,
+    filter: Dict[str, Any],
+    update: Dict[str, Any],
+    sort: Optional[List[Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """ Atomically update the first document matching filter and return it after the update. """
+    with db_connection() as db:
+        collection = db[collection_name]
+        return collection.find_one_and_update(
+            filter, update, sort=sort, return_document=ReturnDocument.AFTER
+        )
+
+
 def collection_delete(collection_name: str, filter: Dict[str, Any]):
     with db_connection() as db:
         collection = db[collection_name]
@@ -58,6 +238,19 @@ def collection_delete(collection_name: str, filter: Dict[str, Any]):
         return result.deleted_count
 
 
+def collection_delete_many(collection_name: str, filter: Dict[str, Any]):
+    with db_connection() as db:
+        collection = db[collection_name]
+        result = collection.delete_many(filter)
+        return result.deleted_count
+
+
+def collection_create_index(collection_name: str, keys: Any, **kwargs) -> str:
+    """ Create an index unless an identical one exists, and return its name. """
+    with db_connection() as db:
+        return db[collection_name].create_index(keys, **kwargs)
+
+
 def collection_create_vector_index_if_not_exists(collection_name: str, embedding_dim: int):
     """ Ensure a vector index called vector_knn_index in collection_name has been created. """
     with db_connection() as db:
@@ -0,0 +1,76 @@
+"""
+In-process BM25 inverted index used for lexical search without a text index in MongoDB.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Sequence, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 index with incremental add and delete.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, ids: Sequence[Any], contents: Sequence[str]) -> None:
+        with self._lock:
+            self.delete(ids)
+            for id, content in zip(ids, contents):
+                terms = Counter(tokenize(content or ""))
+                self._doc_terms[str(id)] = terms
+                self._doc_lengths[str(id)] = sum(terms.values())
+                self._total_length += self._doc_lengths[str(id)]
+                for term, frequency in terms.items():
+                    self._postings[term][str(id)] = frequency
+
+    def delete(self, ids: Sequence[Any]) -> None:
+        with self._lock:
+            for id in ids:
+                terms = self._doc_terms.pop(str(id), None)
+                if terms is None:
+                    continue
+                self._total_length -= self._doc_lengths.pop(str(id))
+                for term in terms:
+                    postings = self._postings[term]
+                    postings.pop(str(id), None)
+                    if not postings:
+                        del self._postings[term]
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """ Return (id, BM25 score) pairs of the best matching documents. """
+        query_terms = set(tokenize(query))
+        scores: Dict[str, float] = defaultdict(float)
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[id] / average_length)
+                    scores[id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:limit]
@@ -0,0 +1,820 @@
+"""
+Vector stores used for semantic search over embedded collections.
+
+AtlasVectorStore relies on MongoDB Atlas $vectorSearch. LocalVectorStore keeps
+the vectors in process as float32 NumPy matrices with an IVF approximate index,
+so search also works against plain MongoDB.
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from bson import ObjectId
+from loguru import logger
+from pymongo import TEXT
+from pymongo.errors import OperationFailure
+
+from remind.database.mongodb import (collection_create_vector_index_if_not_exists,
+                                     collection_query, db_connection)
+from remind.database.text_index import BM25Index
+
+
+def _to_document_id(id: str) -> Any:
+    return ObjectId(id) if ObjectId.is_valid(id) else id
+
+
+class VectorStore(ABC):
+    """
+    Abstract base class for vector stores.
+    """
+
+    @abstractmethod
+    def ensure_index(self, collection_name: str, embedding_dim: int) -> None:
+        """
+        Make sure collection_name can be searched with vectors of embedding_dim.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(
+        self,
+        collection_name: str,
+        ids: Sequence[Any],
+        embeddings: Sequence[List[float]],
+        contents: Optional[Sequence[str]] = None,
+    ) -> None:
+        """
+        Add or replace the vectors, and optionally the text contents, of the given document ids.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, collection_name: str, ids: Sequence[Any]) -> None:
+        """
+        Remove the vectors of the given document ids.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int,
+        fields: List[str],
+        num_candidates: Optional[int] = None,
+        minimum_score: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to limit documents most similar to query_vector, best first.
+        Each document contains _id, the requested fields and a cosine "score" in [0, 1]
+        of at least minimum_score.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def text_search(
+        self,
+        collection_name: str,
+        query: str,
+        limit: int,
+        fields: List[str],
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to limit documents whose content best matches query lexically, best first.
+        Each document contains _id, the requested fields and a relevance "score".
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _search_each_collection(search_collection, collection_names: List[str], limit: int) -> List[Dict[str, Any]]:
+        def tagged_search(collection_name: str) -> List[Dict[str, Any]]:
+            results = search_collection(collection_name)
+            for result in results:
+                result["collection"] = collection_name
+            return results
+
+        if len(collection_names) == 1:
+            return tagged_search(collection_names[0])
+        with ThreadPoolExecutor(max_workers=len(collection_names)) as executor:
+            all_results = [
+                result
+                for results in executor.map(tagged_search, collection_names)
+                for result in results
+            ]
+        all_results.sort(key=lambda x: x["score"], reverse=True)
+        return all_results[:limit]
+
+    def search_collections(
+        self,
+        collection_fields: Dict[str, List[str]],
+        query_vector: List[float],
+        limit: int,
+        num_candidates: Optional[int] = None,
+        minimum_score: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Search several collections at once and return the overall best limit documents.
+        collection_fields maps each collection name to the fields to return, and every
+        document gets a "collection" key naming the collection it came from.
+        """
+        return self._search_each_collection(
+            lambda collection_name: self.search(
+                collection_name,
+                query_vector,
+                limit,
+                collection_fields[collection_name],
+                num_candidates=num_candidates,
+                minimum_score=minimum_score,
+            ),
+            list(collection_fields),
+            limit,
+        )
+
+    async def asearch_collections(
+        self,
+        collection_fields: Dict[str, List[str]],
+        query_vector: List[float],
+        limit: int,
+        num_candidates: Optional[int] = None,
+        minimum_score: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        search_collections without blocking the event loop. The pymongo calls run in a worker thread.
+        """
+        return await asyncio.to_thread(
+            self.search_collections,
+            collection_fields,
+            query_vector,
+            limit,
+            num_candidates,
+            minimum_score,
+        )
+
+    def text_search_collections(
+        self,
+        collection_fields: Dict[str, List[str]],
+        query: str,
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Lexical counterpart of search_collections.
+        """
+        return self._search_each_collection(
+            lambda collection_name: self.text_search(
+                collection_name, query, limit, collection_fields[collection_name]
+            ),
+            list(collection_fields),
+            limit,
+        )
+
+    async def atext_search_collections(
+        self,
+        collection_fields: Dict[str, List[str]],
+        query: str,
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        text_search_collections without blocking the event loop.
+        """
+        return await asyncio.to_thread(self.text_search_collections, collection_fields, query, limit)
+
+
+class AtlasVectorStore(VectorStore):
+    """
+    Vector store using the vector_knn_index search index of MongoDB Atlas.
+    The index is maintained by MongoDB, so add and delete are no-ops.
+    """
+
+    index_name = "vector_knn_index"
+    text_index_name = "content_text"
+
+    def __init__(self):
+        self._text_indexed_collections = set()
+
+    def ensure_index(self, collection_name: str, embedding_dim: int) -> None:
+        collection_create_vector_index_if_not_exists(collection_name, embedding_dim)
+
+    def add(
+        self,
+        collection_name: str,
+        ids: Sequence[Any],
+        embeddings: Sequence[List[float]],
+        contents: Optional[Sequence[str]] = None,
+    ) -> None:
+        pass
+
+    def delete(self, collection_name: str, ids: Sequence[Any]) -> None:
+        pass
+
+    def _search_pipeline(
+        self,
+        query_vector: List[float],
+        limit: int,
+        fields: List[str],
+        num_candidates: Optional[int],
+        minimum_score: float,
+        extra_fields: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                '$vectorSearch': {
+                    'index': self.index_name,
+                    'path': 'embedding',
+                    'queryVector': query_vector,
+                    'numCandidates': num_candidates or 15 * limit,
+                    'limit': limit,
+                }
+            },
+            {
+                '$project': {
+                    '_id': 1,
+                    **{field: 1 for field in fields},
+                    **(extra_fields or {}),
+                    'score': {
+                        '$meta': 'vectorSearchScore'
+                    }
+                }
+            },
+            {
+                '$match': {
+                    'score': {'$gte': minimum_score}
+                }
+            },
+        ]
+
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int,
+        fields: List[str],
+        num_candidates: Optional[int] = None,
+        minimum_score: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        with db_connection() as db:
+            collection = db[collection_name]
+            return list(collection.aggregate(
+                self._search_pipeline(query_vector, limit, fields, num_candidates, minimum_score)
+            ))
+
+    def text_search(
+        self,
+        collection_name: str,
+        query: str,
+        limit: int,
+        fields: List[str],
+    ) -> List[Dict[str, Any]]:
+        with db_connection() as db:
+            collection = db[collection_name]
+            if collection_name not in self._text_indexed_collections:
+                collection.create_index([("content", TEXT)], name=self.text_index_name)
+                self._text_indexed_collections.add(collection_name)
+            return list(collection.aggregate([
+                {'$match': {'$text': {'$search': query}}},
+                {
+                    '$project': {
+                        '_id': 1,
+                        **{field: 1 for field in fields},
+                        'score': {'$meta': 'textScore'},
+                    }
+                },
+                {'$sort': {'score': -1}},
+                {'$limit': limit},
+            ]))
+
+    def search_collections(
+        self,
+        collection_fields: Dict[str, List[str]],
+        query_vector: List[float],
+        limit: int,
+        num_candidates: Optional[int] = None,
+        minimum_score: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Run every collection's $vectorSearch in one aggregation joined with $unionWith,
+        sorted and truncated on the server. Falls back to concurrent searches on
+        deployments that do not support $vectorSearch inside $unionWith.
+        """
+        if len(collection_fields) < 2:
+            return super().search_collections(
+                collection_fields, query_vector, limit, num_candidates, minimum_score
+            )
+
+        def pipeline(collection_name: str) -> List[Dict[str, Any]]:
+            return self._search_pipeline(
+                query_vector,
+                limit,
+                collection_fields[collection_name],
+                num_candidates,
+                minimum_score,
+                extra_fields={'collection': {'$literal': collection_name}},
+            )
+
+        first_collection, *other_collections = collection_fields
+        try:
+            with db_connection() as db:
+                return list(db[first_collection].aggregate([
+                    *pipeline(first_collection),
+                    *[
+                        {'$unionWith': {'coll': collection_name, 'pipeline': pipeline(collection_name)}}
+                        for collection_name in other_collections
+                    ],
+                    {'$sort': {'score': -1}},
+                    {'$limit': limit},
+                ]))
+        except OperationFailure as e:
+            logger.warning(f"$unionWith vector search failed, searching collections concurrently: {str(e)}")
+            return super().search_collections(
+                collection_fields, query_vector, limit, num_candidates, minimum_score
+            )
+
+
+class LocalVectorIndex:
+    """
+    In-process inverted file (IVF) index over L2-normalized float32 vectors.
+
+    Vectors live in one contiguous matrix. Deletions are tombstoned and compacted
+    once they make up a quarter of the rows. Below train_threshold vectors the
+    search is exhaustive, which takes about a millisecond at that size; above it the
+    index is clustered with spherical k-means and the closest clusters are scanned:
+    at least nprobe of them, and an eighth of all clusters so that recall holds as
+    the number of clusters grows.
+    """
+
+    def __init__(self, dim: int, nprobe: int = 8, train_threshold: int = 50_000):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        # Version of the source collection the vectors were saved from, see LocalVectorStore
+        self.stamp: Optional[Dict[str, Any]] = None
+        self._lock = threading.RLock()
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._alive = np.empty(0, dtype=bool)
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._id_to_row)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        if needed <= self._vectors.shape[0] and self._vectors.flags.writeable:
+            return
+        capacity = max(needed, 2 * self._vectors.shape[0], 1024)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        assignments[:self._size] = self._assignments[:self._size]
+        self._assignments = assignments
+
+    def add(self, ids: Sequence[Any], embeddings: Sequence[List[float]]) -> None:
+        if not len(ids):
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), self.dim))
+        with self._lock:
+            self.delete(ids)
+            self._reserve(len(ids))
+            start, end = self._size, self._size + len(ids)
+            self._vectors[start:end] = vectors
+            self._alive[start:end] = True
+            for row, id in enumerate(ids, start):
+                self._ids.append(str(id))
+                self._id_to_row[str(id)] = row
+            if self._centroids is not None:
+                self._assignments[start:end] = np.argmax(vectors @ self._centroids.T, axis=1)
+            self._size = end
+            if len(self) >= self.train_threshold and len(self) >= 2 * self._trained_size:
+                self.train()
+
+    def delete(self, ids: Sequence[Any]) -> None:
+        with self._lock:
+            for id in ids:
+                row = self._id_to_row.pop(str(id), None)
+                if row is not None:
+                    self._alive[row] = False
+            if self._size and len(self) < 0.75 * self._size:
+                self._compact()
+
+    def _compact(self) -> None:
+        rows = np.flatnonzero(self._alive[:self._size])
+        self._vectors = np.ascontiguousarray(self._vectors[rows])
+        self._assignments = self._assignments[rows].copy()
+        self._alive = np.ones(len(rows), dtype=bool)
+        self._ids = [self._ids[row] for row in rows]
+        self._id_to_row = {id: row for row, id in enumerate(self._ids)}
+        self._size = len(rows)
+
+    def train(self, iterations: int = 10, seed: int = 0) -> None:
+        """ Cluster the live vectors with spherical k-means. """
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            if len(rows) < self.train_threshold:
+                self._centroids = None
+                return
+            rng = np.random.default_rng(seed)
+            nlist = int(4 * np.sqrt(len(rows)))
+            sample = self._vectors[rng.choice(rows, size=min(len(rows), 256 * nlist), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                sums[empty] = centroids[empty]
+                centroids = self._normalize(sums)
+            self._centroids = centroids
+            self._assignments[:self._size] = np.argmax(self.vectors @ centroids.T, axis=1)
+            self._trained_size = len(rows)
+            logger.debug(f"Trained IVF index with {nlist} lists over {len(rows)} vectors")
+
+    def search(self, query_vector: List[float], limit: int) -> List[tuple]:
+        """ Return (id, cosine similarity) pairs of the closest vectors. """
+        query = self._normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, self.dim))[0]
+        with self._lock:
+            if not len(self):
+                return []
+            if self._centroids is None and len(self) == self._size:
+                rows = np.arange(self._size)
+            elif self._centroids is None:
+                rows = np.flatnonzero(self._alive[:self._size])
+            else:
+                nprobe = min(max(self.nprobe, len(self._centroids) // 8), len(self._centroids))
+                probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+                rows = np.flatnonzero(
+                    self._alive[:self._size] & np.isin(self._assignments[:self._size], probe)
+                )
+            scores = self.vectors @ query if len(rows) == self._size else self._vectors[rows] @ query
+            ids = self._ids
+        limit = min(limit, len(rows))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[rows[i]], float(scores[i])) for i in top]
+
+    def save(self, path: Path, stamp: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Persist the live vectors as a new version under path, then point path/CURRENT at it.
+        Files of a version are never rewritten, so indexes memory-mapped from an older
+        version, in this or another process, keep reading consistent data.
+        """
+        # Only references are taken under the lock. Rows below _size are never modified in place:
+        # add appends past them, and compaction and growth build new arrays. So the copy of the
+        # matrix, which is large, happens without holding up searches.
+        with self._lock:
+            self.stamp = stamp
+            rows = np.flatnonzero(self._alive[:self._size])
+            all_vectors = self._vectors
+            all_ids = self._ids
+            # train() reassigns clusters in place, so the assignments are copied right away
+            assignments = self._assignments[rows]
+            centroids = self._centroids
+        # Copies, so that nothing written below is a view of a memory-mapped file
+        vectors = np.ascontiguousarray(all_vectors[rows])
+        ids = [all_ids[row] for row in rows]
+
+        version = f"v{time.time_ns()}-{os.getpid()}-{threading.get_ident()}"
+        version_path = path / version
+        version_path.mkdir(parents=True)
+        np.save(version_path / "vectors.npy", vectors)
+        np.save(version_path / "assignments.npy", assignments)
+        if centroids is not None:
+            np.save(version_path / "centroids.npy", centroids)
+        with open(version_path / "ids.json", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "stamp": stamp, "ids": ids}, f)
+
+        tmp_current = path / f"CURRENT.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_current.write_text(version, encoding="utf-8")
+        os.replace(tmp_current, path / "CURRENT")
+        self._remove_old_versions(path)
+
+    @staticmethod
+    def _remove_old_versions(path: Path, min_age: float = 60.0) -> None:
+        # Versions younger than min_age may still be being written by another process
+        current = (path / "CURRENT").read_text(encoding="utf-8").strip()
+        for version_path in path.glob("v*"):
+            if version_path.name == current or not version_path.is_dir():
+                continue
+            if time.time() - version_path.stat().st_mtime < min_age:
+                continue
+            shutil.rmtree(version_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> Optional["LocalVectorIndex"]:
+        try:
+            version_path = path / (path / "CURRENT").read_text(encoding="utf-8").strip()
+            with open(version_path / "ids.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            index = cls(meta["dim"], **kwargs)
+            index.stamp = meta.get("stamp")
+            # Memory-map the matrix; it is copied into a writable buffer on the first add
+            index._vectors = np.load(version_path / "vectors.npy", mmap_mode="r")
+            index._assignments = np.load(version_path / "assignments.npy")
+            if (version_path / "centroids.npy").exists():
+                index._centroids = np.load(version_path / "centroids.npy")
+        except FileNotFoundError:
+            # Not saved yet, or the version was replaced while it was being opened
+            return None
+        index._size = len(meta["ids"])
+        index._ids = meta["ids"]
+        index._id_to_row = {id: row for row, id in enumerate(index._ids)}
+        index._alive = np.ones(index._size, dtype=bool)
+        if index._centroids is not None:
+            index._trained_size = index._size
+        return index
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vector store keeping one LocalVectorIndex per collection, persisted under path.
+
+    MongoDB stays the source of truth and the saved indexes are a cache of it. Each index
+    carries a stamp of the collection it is in sync with: the number of embedded documents
+    and their latest update time. At most every sync_interval seconds the stamp is compared
+    with MongoDB, and the documents updated since, or missing or deleted, are synced. So
+    chunks written by other processes, such as the ingest command, show up without a restart.
+    Indexes are saved once flush_every changes, or a twentieth of the index, have piled up.
+    Lexical search uses in-memory BM25 indexes built from MongoDB on first use.
+    """
+
+    def __init__(self, path: str, nprobe: int = 8, flush_every: int = 1000, sync_interval: float = 10.0):
+        self.path = Path(path)
+        self.nprobe = nprobe
+        self.flush_every = flush_every
+        self.sync_interval = sync_interval
+        self._indexes: Dict[str, LocalVectorIndex] = {}
+        self._text_indexes: Dict[str, BM25Index] = {}
+        self._pending: Dict[str, int] = {}
+        self._synced_at: Dict[str, float] = {}
+        self._sync_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _collection_stamp(collection_name: str) -> Dict[str, Any]:
+        """ Number of embedded documents of the collection and their latest update time. """
+        with db_connection() as db:
+            result = list(db[collection_name].aggregate([
+                {"$match": {"embedding.0": {"$exists": True}}},
+                {"$group": {"_id": None, "count": {"$sum": 1}, "updated": {"$max": "$updated"}}},
+            ]))
+        if not result:
+            return {"count": 0, "updated": None}
+        updated = result[0]["updated"]
+        return {"count": result[0]["count"], "updated": updated.isoformat() if updated else None}
+
+    def _save_index(self, collection_name: str) -> None:
+        index = self._indexes[collection_name]
+        # Changes made after the last sync are saved too; the next sync re-reads them harmlessly
+        index.save(self.path / collection_name, stamp=index.stamp)
+
+    def _rebuild_index(self, collection_name: str) -> Optional[LocalVectorIndex]:
+        stamp = self._collection_stamp(collection_name)
+        with db_connection() as db:
+            documents = list(db[collection_name].find(
+                {"embedding.0": {"$exists": True}}, {"_id": 1, "embedding": 1}
+            ))
+        if not documents:
+            return None
+        logger.info(f"Rebuilding local vector index for {collection_name} from {len(documents)} documents")
+        index = LocalVectorIndex(len(documents[0]["embedding"]), nprobe=self.nprobe)
+        index.add([doc["_id"] for doc in documents], [doc["embedding"] for doc in documents])
+        index.save(self.path / collection_name, stamp=stamp)
+        return index
+
+    def _sync_index(self, collection_name: str, index: LocalVectorIndex) -> bool:
+        """
+        Bring index up to date with MongoDB. Returns False if it cannot be synced
+        incrementally because the embedding dimension changed.
+        """
+        # Take the stamp first: anything written while syncing is picked up by the next sync
+        stamp = self._collection_stamp(collection_name)
+        if index.stamp == stamp and len(index) == stamp["count"]:
+            return True
+        embedded_filter = {"embedding.0": {"$exists": True}}
+        changed_filter = dict(embedded_filter)
+        if index.stamp and index.stamp.get("updated"):
+            changed_filter["updated"] = {"$gte": datetime.fromisoformat(index.stamp["updated"])}
+        with db_connection() as db:
+            collection = db[collection_name]
+            changed = list(collection.find(changed_filter, {"_id": 1, "embedding": 1}))
+            if any(len(doc["embedding"]) != index.dim for doc in changed):
+                return False
+            index.add([doc["_id"] for doc in changed], [doc["embedding"] for doc in changed])
+
+            if len(index) != stamp["count"]:
+                # Deleted documents, or documents without an update time
+                stored_ids = {str(doc["_id"]) for doc in collection.find(embedded_filter, {"_id": 1})}
+                indexed_ids = set(index.ids())
+                index.delete([id for id in indexed_ids if id not in stored_ids])
+                missing_ids = [_to_document_id(id) for id in stored_ids - indexed_ids]
+                if missing_ids:
+                    missing = list(collection.find({"_id": {"$in": missing_ids}}, {"_id": 1, "embedding": 1}))
+                    if any(len(doc["embedding"]) != index.dim for doc in missing):
+                        return False
+                    index.add([doc["_id"] for doc in missing], [doc["embedding"] for doc in missing])
+        index.stamp = stamp
+        logger.debug(f"Synced local vector index for {collection_name} with {len(changed)} changed documents")
+        return True
+
+    def _load_index(self, collection_name: str) -> Optional[LocalVectorIndex]:
+        index = LocalVectorIndex.load(self.path / collection_name, nprobe=self.nprobe)
+        if index is not None and self._sync_index(collection_name, index):
+            return index
+        return self._rebuild_index(collection_name)
+
+    def _get_index(self, collection_name: str, embedding_dim: Optional[int] = None) -> Optional[LocalVectorIndex]:
+        with self._lock:
+            if collection_name not in self._indexes:
+                index = self._load_index(collection_name)
+                if index is None and embedding_dim:
+                    index = LocalVectorIndex(embedding_dim, nprobe=self.nprobe)
+                    index.stamp = self._collection_stamp(collection_name)
+                if index is None:
+                    return None
+                self._indexes[collection_name] = index
+                self._synced_at[collection_name] = time.monotonic()
+                self._sync_locks[collection_name] = threading.Lock()
+            index = self._indexes[collection_name]
+            sync_due = time.monotonic() - self._synced_at[collection_name] >= self.sync_interval
+            sync_lock = self._sync_locks[collection_name]
+        # Searches go on with the current index while one thread syncs it
+        if sync_due and sync_lock.acquire(blocking=False):
+            try:
+                self._synced_at[collection_name] = time.monotonic()
+                if not self._sync_index(collection_name, index):
+                    with self._lock:
+                        rebuilt = self._rebuild_index(collection_name)
+                        if rebuilt is not None:
+                            self._indexes[collection_name] = index = rebuilt
+            except Exception as e:
+                logger.warning(f"Could not sync local vector index for {collection_name}: {str(e)}")
+            finally:
+                sync_lock.release()
+        return index
+
+    def _changed(self, collection_name: str, count: int) -> None:
+        with self._lock:
+            self._pending[collection_name] = self._pending.get(collection_name, 0) + count
+            # Saving writes the whole matrix, so large indexes are saved less often
+            if self._pending[collection_name] < max(self.flush_every, len(self._indexes[collection_name]) // 20):
+                return
+            self._pending[collection_name] = 0
+        self._save_index(collection_name)
+
+    def flush(self) -> None:
+        """ Persist every index with unsaved changes. """
+        with self._lock:
+            pending = [name for name, count in self._pending.items() if count]
+            self._pending.clear()
+        for collection_name in pending:
+            self._save_index(collection_name)
+
+    def ensure_index(self, collection_name: str, embedding_dim: int) -> None:
+        self._get_index(collection_name, embedding_dim)
+
+    def _get_text_index(self, collection_name: str) -> BM25Index:
+        with self._lock:
+            if collection_name not in self._text_indexes:
+                with db_connection() as db:
+                    documents = list(db[collection_name].find({}, {"_id": 1, "content": 1}))
+                text_index = BM25Index()
+                text_index.add(
+                    [doc["_id"] for doc in documents],
+                    [doc.get("content") or "" for doc in documents],
+                )
+                self._text_indexes[collection_name] = text_index
+            return self._text_indexes[collection_name]
+
+    def add(
+        self,
+        collection_name: str,
+        ids: Sequence[Any],
+        embeddings: Sequence[List[float]],
+        contents: Optional[Sequence[str]] = None,
+    ) -> None:
+        # Text indexes not built yet will read the new documents from MongoDB on first use
+        if contents is not None and collection_name in self._text_indexes:
+            self._text_indexes[collection_name].add(ids, contents)
+        pairs = [(id, embedding) for id, embedding in zip(ids, embeddings) if embedding]
+        if not pairs:
+            return
+        ids, embeddings = zip(*pairs)
+        index = self._get_index(collection_name, len(embeddings[0]))
+        index.add(ids, embeddings)
+        self._changed(collection_name, len(ids))
+
+    def delete(self, collection_name: str, ids: Sequence[Any]) -> None:
+        if collection_name in self._text_indexes:
+            self._text_indexes[collection_name].delete(ids)
+        index = self._get_index(collection_name)
+        if index is None:
+            return
+        index.delete(ids)
+        self._changed(collection_name, len(ids))
+
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int,
+        fields: List[str],
+        num_candidates: Optional[int] = None,
+        minimum_score: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        index = self._get_index(collection_name)
+        if index is None:
+            return []
+        hits = index.search(query_vector, limit)
+        if not hits:
+            return []
+        # Match the [0, 1] scale of Atlas vectorSearchScore for cosine similarity
+        scores = {id: (1 + similarity) / 2 for id, similarity in hits}
+        scores = {id: score for id, score in scores.items() if score >= minimum_score}
+        if not scores:
+            return []
+        return self._fetch_scored(collection_name, scores, fields)
+
+    def text_search(
+        self,
+        collection_name: str,
+        query: str,
+        limit: int,
+        fields: List[str],
+    ) -> List[Dict[str, Any]]:
+        hits = self._get_text_index(collection_name).search(query, limit)
+        if not hits:
+            return []
+        return self._fetch_scored(collection_name, dict(hits), fields)
+
+    @staticmethod
+    def _fetch_scored(collection_name: str, scores: Dict[str, float], fields: List[str]) -> List[Dict[str, Any]]:
+        documents = collection_query(
+            collection_name,
+            {"_id": {"$in": [_to_document_id(id) for id in scores]}},
+        )
+        results = []
+        for doc in documents:
+            result = {key: doc[key] for key in ["_id", *fields] if key in doc}
+            result["score"] = scores[str(doc["_id"])]
+            results.append(result)
+        results.sort(key=lambda x: x["score"], reverse=True)
+        return results
+
+
+_vector_store: Optional[VectorStore] = None
+_vector_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Get the process-wide vector store selected by VECTOR_STORE (atlas or local).
+    """
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                backend = os.environ.get("VECTOR_STORE", "atlas").lower()
+                if backend == "local":
+                    _vector_store = LocalVectorStore(
+                        os.environ.get("VECTOR_STORE_PATH", "data/vector_store"),
+                        nprobe=int(os.environ.get("VECTOR_STORE_NPROBE", 8)),
+                        sync_interval=float(os.environ.get("VECTOR_STORE_SYNC_INTERVAL", 10)),
+                    )
+                else:
+                    _vector_store = AtlasVectorStore()
+    return _vector_store
@@ -6,10 +6,13 @@ from loguru import logger
 from pydantic import (BaseModel, Field, ValidationError, field_validator,
                       model_validator)
 from pydantic_core import core_schema
+from pymongo import UpdateOne
 
-from remind.database.mongodb import (
-    collection_create, collection_create_vector_index_if_not_exists,
-    collection_delete, collection_query, collection_update, collection_upsert)
+from remind.database.mongodb import (collection_bulk_write, collection_create,
+                                     collection_delete, collection_insert_many,
+                                     collection_query, collection_update,
+                                     collection_upsert)
+from remind.database.vector_store import get_vector_store
 from remind.exceptions import (DatabaseOperationError, InvalidInputError,
                                NotFoundError)
 
@@ -150,7 +153,7 @@ class ObjectModel(BaseModel):
                         else []
                     )
                     if EMBEDDING_MODEL:
-                        collection_create_vector_index_if_not_exists(self.__class__.table_name, len(data["embedding"]))
+                        get_vector_store().ensure_index(self.__class__.table_name, len(data["embedding"]))
 
             if self.id is None:
                 data["created"] = datetime.now()
@@ -160,6 +163,14 @@ class ObjectModel(BaseModel):
                 logger.debug(f"Updating record with id {self.id}")
                 collection_update(self.__class__.table_name, {"_id": self.id}, data)
 
+            if data.get("embedding"):
+                get_vector_store().add(
+                    self.__class__.table_name,
+                    [self.id],
+                    [data["embedding"]],
+                    contents=[self.get_embedding_content()],
+                )
+
             # Update the current instance with the result
             updated_document = collection_query(self.__class__.table_name, {"_id": self.id})
             if updated_document:
@@ -178,6 +189,99 @@ class ObjectModel(BaseModel):
             logger.exception(e)
             raise DatabaseOperationError(e)
 
+    @classmethod
+    def save_many(cls: Type[T], objects: List[T]) -> List[ObjectId]:
+        """
+        Validate, embed and save a list of objects with unordered bulk writes.
+        New objects are inserted and existing ones updated. Returns the ids in input order.
+        """
+        from remind.domain.models import model_manager
+
+        if not cls.table_name:
+            raise InvalidInputError(
+                "save_many() must be called from a specific model class"
+            )
+        if not objects:
+            return []
+
+        try:
+            now = datetime.now()
+            all_data = []
+            for obj in objects:
+                obj.model_validate(obj.model_dump(by_alias=True), strict=True)
+                data = obj._prepare_save_data()
+                data["updated"] = now
+                data["created"] = now if obj.id is None else obj.created
+                all_data.append(data)
+
+            embedding_targets = [
+                (data, obj.get_embedding_content())
+                for obj, data in zip(objects, all_data)
+                if obj.needs_embedding() and obj.get_embedding_content()
+            ]
+            if embedding_targets:
+                EMBEDDING_MODEL = model_manager.embedding_model
+                if not EMBEDDING_MODEL:
+                    logger.warning(
+                        "No embedding model found. Content will not be searchable."
+                    )
+                    for data, _ in embedding_targets:
+                        data["embedding"] = []
+                else:
+                    embeddings = EMBEDDING_MODEL.embed_many(
+                        [content for _, content in embedding_targets]
+                    )
+                    for (data, _), embedding in zip(embedding_targets, embeddings):
+                        data["embedding"] = embedding
+                    get_vector_store().ensure_index(cls.table_name, len(embeddings[0]))
+
+            updates = [
+                UpdateOne({"_id": obj.id}, {"$set": data})
+                for obj, data in zip(objects, all_data)
+                if obj.id is not None
+            ]
+            if updates:
+                logger.debug(f"Updating {len(updates)} records in {cls.table_name}")
+                collection_bulk_write(cls.table_name, updates)
+
+            new_items = [
+                (obj, data) for obj, data in zip(objects, all_data) if obj.id is None
+            ]
+            if new_items:
+                inserted_ids = collection_insert_many(
+                    cls.table_name, [data for _, data in new_items]
+                )
+                for (obj, _), inserted_id in zip(new_items, inserted_ids):
+                    obj.id = inserted_id
+
+            embedded = [
+                (obj.id, data["embedding"], obj.get_embedding_content())
+                for obj, data in zip(objects, all_data)
+                if data.get("embedding")
+            ]
+            if embedded:
+                get_vector_store().add(
+                    cls.table_name,
+                    [id for id, _, _ in embedded],
+                    [embedding for _, embedding, _ in embedded],
+                    contents=[content for _, _, content in embedded],
+                )
+
+            # Update the instances with the saved data instead of reading them back
+            for obj, data in zip(objects, all_data):
+                obj.created = data["created"]
+                obj.updated = data["updated"]
+
+            return [obj.id for obj in objects]
+
+        except ValidationError as e:
+            logger.error(f"Validation failed: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error saving {cls.table_name}: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+
     def _prepare_save_data(self) -> Dict[str, Any]:
         data = self.model_dump(by_alias=True)
         return {key: value for key, value in data.items() if value is not None}
@@ -187,6 +291,8 @@ class ObjectModel(BaseModel):
             raise InvalidInputError("Cannot delete object without an ID")
         try:
             logger.debug(f"Deleting record with id {self.id}")
+            if self.needs_embedding():
+                get_vector_store().delete(self.__class__.table_name, [self.id])
             return collection_delete(self.__class__.table_name, {"_id": self.id})
         except Exception as e:
             logger.error(
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+from typing import ClassVar, Dict, List, Literal, Optional, Tuple
+
+from loguru import logger
+from pydantic import Field
+
+from remind.database.mongodb import (collection_find_one_and_update,
+                                     collection_query, collection_update)
+from remind.exceptions import DatabaseOperationError, NotFoundError
+
+from .base import ObjectModel, PyObjectId
+from .notes import Asset, Source
+
+JobStatus = Literal["queued", "running", "failed", "done"]
+
+INGESTION_STAGES = ("convert", "chunk", "embed", "insights")
+
+
+class IngestionJob(ObjectModel):
+    """
+    A note waiting to be ingested in the background.
+
+    The job carries whatever note content is already known. Missing content is produced
+    by the job: the text is converted from input_path or asset.url, and the title, topics
+    and insights are generated when transform is set.
+    """
+    table_name: ClassVar[str] = "ingestion_job"
+    status: JobStatus = "queued"
+    stage: Optional[str] = None
+    progress: Dict[str, float] = Field(default_factory=dict)
+    attempts: int = 0
+    max_attempts: int = 3
+    error: Optional[str] = None
+    run_after: Optional[datetime] = None
+    heartbeat: Optional[datetime] = None
+    source_id: Optional[PyObjectId] = None
+    # Saved source with the same content, when the job turned out to be a duplicate
+    duplicate_of: Optional[PyObjectId] = None
+
+    input_path: Optional[str] = None
+    asset: Optional[Asset] = None
+    title: Optional[str] = None
+    topics: List[str] = Field(default_factory=list)
+    full_text: Optional[str] = None
+    insights: List[Tuple[str, str]] = Field(default_factory=list)
+    transform: bool = False
+
+    @property
+    def display_name(self) -> str:
+        if self.title:
+            return self.title
+        if self.asset and (self.asset.file_path or self.asset.url):
+            return self.asset.file_path or self.asset.url
+        return f"Note {self.id}"
+
+    def stage_done(self, stage: str) -> bool:
+        return self.progress.get(stage, 0.0) >= 1.0
+
+    @classmethod
+    def pending(cls) -> List["IngestionJob"]:
+        """ Get the jobs that are not done, oldest first. """
+        try:
+            result = collection_query(cls.table_name, {"status": {"$ne": "done"}})
+            jobs = [cls(**job) for job in result]
+            return sorted(jobs, key=lambda job: job.created or datetime.min)
+        except Exception as e:
+            logger.error(f"Error fetching pending ingestion jobs: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+
+    @classmethod
+    def pending_source_ids(cls) -> List[PyObjectId]:
+        """ Get the ids of sources whose ingestion has not finished yet. """
+        result = collection_query(
+            cls.table_name, {"status": {"$ne": "done"}, "source_id": {"$exists": True}}
+        )
+        return [job["source_id"] for job in result]
+
+    @classmethod
+    def claim_next(cls, stale_after: float) -> Optional["IngestionJob"]:
+        """
+        Atomically take the oldest runnable job and mark it running.
+        Running jobs without a heartbeat for stale_after seconds are assumed abandoned and taken again.
+        """
+        now = datetime.now()
+        result = collection_find_one_and_update(
+            cls.table_name,
+            {"$or": [
+                {
+                    "status": "queued",
+                    "$or": [{"run_after": None}, {"run_after": {"$lte": now}}],
+                },
+                {
+                    "status": "running",
+                    "heartbeat": {"$lt": now - timedelta(seconds=stale_after)},
+                },
+            ]},
+            {
+                "$set": {"status": "running", "heartbeat": now, "updated": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created", 1)],
+        )
+        return cls(**result) if result else None
+
+    def update_fields(self, **fields) -> None:
+        """ Update some fields of the job in place, refreshing its heartbeat. """
+        fields["heartbeat"] = fields["updated"] = datetime.now()
+        for key, value in fields.items():
+            if "." not in key:
+                setattr(self, key, value)
+        collection_update(self.table_name, {"_id": self.id}, fields)
+
+    def set_progress(self, stage: str, fraction: float) -> None:
+        """ Record the progress of a stage. This also serves as the heartbeat of the job. """
+        fraction = float(min(max(fraction, 0.0), 1.0))
+        self.progress[stage] = fraction
+        self.update_fields(stage=stage, **{f"progress.{stage}": fraction})
+
+    def touch(self) -> None:
+        """ Refresh the heartbeat so that other workers do not take the job over. """
+        self.update_fields()
+
+    def set_source(self, source_id: PyObjectId) -> None:
+        self.update_fields(source_id=source_id)
+
+    def mark_done(self) -> None:
+        self.update_fields(status="done", stage=None, error=None)
+
+    def mark_failed(self, error: str, backoff: float) -> None:
+        """
+        Requeue the job after an exponential backoff, or mark it failed once
+        it has used up its attempts.
+        """
+        if self.attempts < self.max_attempts:
+            delay = backoff * 2 ** max(self.attempts - 1, 0)
+            self.update_fields(
+                status="queued",
+                error=error,
+                run_after=datetime.now() + timedelta(seconds=delay),
+            )
+            logger.warning(f"Ingestion job {self.id} failed, retrying in {delay:.0f}s: {error}")
+        else:
+            self.update_fields(status="failed", error=error)
+            logger.error(f"Ingestion job {self.id} failed after {self.attempts} attempts: {error}")
+
+    def retry(self) -> None:
+        """ Queue a failed job again with a fresh set of attempts. """
+        self.update_fields(status="queued", attempts=0, run_after=None, error=None)
+
+    def delete(self) -> bool:
+        """ Delete the job together with the note it left half-ingested. """
+        if self.status != "done" and self.source_id:
+            try:
+                Source.get(self.source_id).delete()
+            except NotFoundError:
+                pass
+        return super().delete()
@@ -143,37 +143,42 @@ class ModelManager:
         ), f"Expected EmbeddingModel but got {type(model)}"
         return model
 
-    def get_default_model(self, model_type: str, **kwargs) -> Optional[ModelType]:
+    def get_default_model_id(self, model_type: str) -> Optional[PyObjectId]:
         """
-        Get the default model for a specific type.
-
-        Args:
-            model_type: The type of model to retrieve (e.g., 'chat', 'embedding', etc.)
-            **kwargs: Additional arguments to pass to the model constructor
+        Get the id of the default model for a specific type, or None if there is none.
         """
-        model_id = None
-
         if model_type == "chat":
-            model_id = self.defaults.default_chat_model
+            return self.defaults.default_chat_model
         elif model_type == "transformation":
-            model_id = (
+            return (
                 self.defaults.default_transformation_model
                 or self.defaults.default_chat_model
             )
         elif model_type == "tools":
-            model_id = (
+            return (
                 self.defaults.default_tools_model or self.defaults.default_chat_model
             )
         elif model_type == "large_context":
-            model_id = self.defaults.large_context_model
+            return self.defaults.default_large_context_model
         elif model_type == "vision":
-            model_id = self.defaults.default_vision_model
+            return self.defaults.default_vision_model
         elif model_type == "embedding":
-            model_id = self.defaults.default_embedding_model
+            return self.defaults.default_embedding_model
         elif model_type == "text_to_speech":
-            model_id = self.defaults.default_text_to_speech_model
+            return self.defaults.default_text_to_speech_model
         elif model_type == "speech_to_text":
-            model_id = self.defaults.default_speech_to_text_model
+            return self.defaults.default_speech_to_text_model
+        return None
+
+    def get_default_model(self, model_type: str, **kwargs) -> Optional[ModelType]:
+        """
+        Get the default model for a specific type.
+
+        Args:
+            model_type: The type of model to retrieve (e.g., 'chat', 'embedding', etc.)
+            **kwargs: Additional arguments to pass to the model constructor
+        """
+        model_id = self.get_default_model_id(model_type)
 
         if not model_id:
             return None
@@ -181,7 +186,10 @@ class ModelManager:
         return self.get_model(model_id, **kwargs)
 
     def clear_cache(self):
-        """Clear the model cache"""
+        """Clear the model cache, including the cached LangChain chat models"""
+        for model in self._model_cache.values():
+            if isinstance(model, LanguageModel):
+                model.clear_langchain_cache()
         self._model_cache.clear()
 
 
@@ -1,33 +1,58 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import Any, ClassVar, Dict, List, Literal, Optional, Tuple
+import hashlib
+import threading
+from typing import (Any, Callable, ClassVar, Dict, List, Literal, Optional,
+                    Tuple)
 
 import semchunk
 from loguru import logger
 from pydantic import BaseModel, Field, field_validator
+from pymongo import UpdateMany, UpdateOne
 
-from remind.database.mongodb import collection_delete, collection_query
+from remind.database.mongodb import (collection_bulk_write,
+                                     collection_create_index,
+                                     collection_delete_many, collection_query)
+from remind.database.vector_store import get_vector_store
 from remind.exceptions import DatabaseOperationError, InvalidInputError
 
 from .base import ObjectModel, PyObjectId
 
 chunker = semchunk.chunkerify("o200k_base", chunk_size=1024)
 
+# Number of chunks embedded and saved at a time by Source.vectorize
+VECTORIZE_BATCH_SIZE = 256
+
 def split_text(text: str) -> list[str]:
     chunks = chunker(text)
     return chunks
 
+def content_fingerprint(text: str) -> str:
+    """ Hash of the text with whitespace normalized, used to detect duplicate notes and chunks. """
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+def file_fingerprint(file_path: str) -> str:
+    """ Hash of the bytes of a file, used to detect a file that has been ingested before. """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
 class Asset(BaseModel):
     file_path: Optional[str] = None
     url: Optional[str] = None
+    file_hash: Optional[str] = None
 
 
 class SourceEmbedding(ObjectModel):
     table_name: ClassVar[str] = "source_embedding"
     content: str
     source_id: PyObjectId
+    content_hash: Optional[str] = None
+    # Chunk of another source with the same content, whose embedding is reused
+    duplicate_of: Optional[PyObjectId] = None
 
     def needs_embedding(self) -> bool:
-        return True
+        return self.duplicate_of is None
 
     def get_embedding_content(self) -> Optional[str]:
         return self.content
@@ -76,6 +101,52 @@ class Source(ObjectModel):
     title: Optional[str] = None
     topics: Optional[List[str]] = Field(default_factory=list)
     full_text: Optional[str] = None
+    content_hash: Optional[str] = None
+
+    _indexes_created: ClassVar[bool] = False
+    _indexes_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def ensure_indexes(cls) -> None:
+        """ Create the indexes used to find duplicate sources and chunks, once per process. """
+        if cls._indexes_created:
+            return
+        with cls._indexes_lock:
+            if cls._indexes_created:
+                return
+            collection_create_index(
+                cls.table_name,
+                "content_hash",
+                name="content_hash_unique",
+                unique=True,
+                partialFilterExpression={"content_hash": {"$exists": True}},
+            )
+            collection_create_index(cls.table_name, "asset.file_hash", sparse=True)
+            collection_create_index(SourceEmbedding.table_name, "content_hash")
+            collection_create_index(SourceEmbedding.table_name, "source_id")
+            cls._indexes_created = True
+
+    @classmethod
+    def find_duplicate(
+        cls, full_text: Optional[str] = None, file_hash: Optional[str] = None
+    ) -> Optional["Source"]:
+        """ Find a saved source with the same text, or converted from the same file. """
+        conditions = []
+        if full_text:
+            conditions.append({"content_hash": content_fingerprint(full_text)})
+        if file_hash:
+            conditions.append({"asset.file_hash": file_hash})
+        if not conditions:
+            return None
+        cls.ensure_indexes()
+        result = collection_query(cls.table_name, {"$or": conditions})
+        return cls(**result[0]) if result else None
+
+    def save(self) -> None:
+        if self.full_text and not self.content_hash:
+            self.content_hash = content_fingerprint(self.full_text)
+        self.ensure_indexes()
+        super().save()
 
     def get_context(
         self, context_size: Literal["short", "long"] = "short"
@@ -115,7 +186,11 @@ class Source(ObjectModel):
             logger.exception(e)
             raise DatabaseOperationError("Failed to fetch insights for source")
 
-    def vectorize(self) -> None:
+    def vectorize(self, on_progress: Optional[Callable[[str, float], None]] = None) -> None:
+        """
+        Split the full text into chunks and save their embeddings.
+        on_progress(stage, fraction) is called as the "chunk" and "embed" stages advance.
+        """
         logger.info(f"Starting vectorization for source {self.id}")
 
         try:
@@ -126,20 +201,56 @@ class Source(ObjectModel):
             chunks = split_text(self.full_text)
             chunk_count = len(chunks)
             logger.info(f"Split into {chunk_count} chunks for source {self.id}")
+            if on_progress:
+                on_progress("chunk", 1.0)
 
             if chunk_count == 0:
                 logger.warning("No chunks created after splitting")
                 return
 
-            def process_chunk(source_embedding: SourceEmbedding):
-                source_embedding.save()
+            # Chunks already embedded, for this or another source, reuse that embedding
+            hashes = [content_fingerprint(chunk) for chunk in chunks]
+            canonical_ids = {
+                doc["content_hash"]: doc["_id"]
+                for doc in collection_query(
+                    SourceEmbedding.table_name,
+                    {"content_hash": {"$in": list(set(hashes))}, "duplicate_of": None},
+                    {"_id": 1, "content_hash": 1},
+                )
+            }
+            new_chunks = []
+            duplicate_chunks = []
+            new_hashes = set()
+            for chunk, content_hash in zip(chunks, hashes):
+                if content_hash in canonical_ids or content_hash in new_hashes:
+                    duplicate_chunks.append((content_hash, chunk))
+                else:
+                    new_hashes.add(content_hash)
+                    new_chunks.append((content_hash, chunk))
+
+            for i in range(0, len(new_chunks), VECTORIZE_BATCH_SIZE):
+                embeddings = [
+                    SourceEmbedding(content=chunk, content_hash=content_hash, source_id=self.id)
+                    for content_hash, chunk in new_chunks[i:i + VECTORIZE_BATCH_SIZE]
+                ]
+                SourceEmbedding.save_many(embeddings)
+                canonical_ids.update({embedding.content_hash: embedding.id for embedding in embeddings})
+                if on_progress:
+                    on_progress("embed", min(i + VECTORIZE_BATCH_SIZE, len(new_chunks)) / chunk_count)
 
-            # Process chunks in parallel while preserving order
-            logger.info("Starting parallel processing of chunks")
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                chunk_tasks = [SourceEmbedding(content=chunk, source_id=self.id) for chunk in chunks]
-                # Process all chunks in parallel and get results
-                list(executor.map(process_chunk, chunk_tasks))
+            if duplicate_chunks:
+                SourceEmbedding.save_many([
+                    SourceEmbedding(
+                        content=chunk,
+                        content_hash=content_hash,
+                        source_id=self.id,
+                        duplicate_of=canonical_ids[content_hash],
+                    )
+                    for content_hash, chunk in duplicate_chunks
+                ])
+                logger.info(f"Reused embeddings for {len(duplicate_chunks)} duplicate chunks of source {self.id}")
+            if on_progress:
+                on_progress("embed", 1.0)
             logger.info(f"Vectorization complete for source {self.id}")
 
         except Exception as e:
@@ -160,7 +271,79 @@ class Source(ObjectModel):
             logger.error(f"Error adding insight to source {self.id}: {str(e)}")
             raise  # DatabaseOperationError(e)
 
+    def add_insights(self, insights: List[Tuple[str, str]]) -> List[Any]:
+        """ Add several (insight_type, content) insights with one bulk write. """
+        if any(not insight_type or not content for insight_type, content in insights):
+            raise InvalidInputError("Insight type and content must be provided")
+        try:
+            return SourceInsight.save_many([
+                SourceInsight(
+                    insight_type=insight_type,
+                    content=content,
+                    source_id=self.id,
+                )
+                for insight_type, content in insights
+            ])
+        except Exception as e:
+            logger.error(f"Error adding insights to source {self.id}: {str(e)}")
+            raise
+
+    def _delete_related(self, table_name: str) -> None:
+        ids = [doc["_id"] for doc in collection_query(table_name, {"source_id": self.id}, {"_id": 1})]
+        get_vector_store().delete(table_name, ids)
+        collection_delete_many(table_name, {"source_id": self.id})
+
+    def _hand_over_embeddings(self) -> None:
+        """
+        Before deleting the chunks of the source, move each embedding still reused by chunks
+        of other sources to one of those chunks, and point the others to it.
+        """
+        canonical = {
+            doc["_id"]: doc
+            for doc in collection_query(
+                SourceEmbedding.table_name, {"source_id": self.id, "duplicate_of": None}
+            )
+        }
+        if not canonical:
+            return
+        heirs = {}
+        for doc in collection_query(
+            SourceEmbedding.table_name,
+            {"duplicate_of": {"$in": list(canonical)}, "source_id": {"$ne": self.id}},
+            {"_id": 1, "duplicate_of": 1, "content": 1},
+        ):
+            heirs.setdefault(doc["duplicate_of"], doc)
+        if not heirs:
+            return
+
+        operations = []
+        for canonical_id, heir in heirs.items():
+            operations.append(UpdateOne(
+                {"_id": heir["_id"]},
+                {"$set": {"embedding": canonical[canonical_id].get("embedding", [])}, "$unset": {"duplicate_of": ""}},
+            ))
+            operations.append(UpdateMany(
+                {"duplicate_of": canonical_id, "_id": {"$ne": heir["_id"]}},
+                {"$set": {"duplicate_of": heir["_id"]}},
+            ))
+        collection_bulk_write(SourceEmbedding.table_name, operations)
+        get_vector_store().add(
+            SourceEmbedding.table_name,
+            [heir["_id"] for heir in heirs.values()],
+            [canonical[canonical_id].get("embedding", []) for canonical_id in heirs],
+            contents=[heir["content"] for heir in heirs.values()],
+        )
+        logger.debug(f"Handed over {len(heirs)} reused embeddings of source {self.id}")
+
+    def clear_embeddings(self) -> None:
+        """ Delete the embedded chunks of the source, e.g. before vectorizing it again. """
+        self._hand_over_embeddings()
+        self._delete_related(SourceEmbedding.table_name)
+
+    def clear_insights(self) -> None:
+        self._delete_related(SourceInsight.table_name)
+
     def delete(self):
-        collection_delete("source_embedding", {"source_id": self.id})
-        collection_delete("source_insight", {"source_id": self.id})
+        self.clear_embeddings()
+        self.clear_insights()
         super().delete()
@@ -1,24 +1,38 @@
+import asyncio
+import hashlib
 import operator
+import os
 from typing import Annotated, List
 
 from langchain_core.output_parsers.pydantic import PydanticOutputParser
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 from langgraph.types import Send
+from loguru import logger
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
-from remind.database.mongodb import db_connection
+from remind.database.vector_store import get_vector_store
 from remind.domain.models import model_manager
 from remind.domain.notes import Source, SourceEmbedding, SourceInsight
-from remind.graphs.utils import provision_langchain_model
+from remind.graphs.utils import provision_langchain_model, token_count
 from remind.prompter import Prompter
 
+# Hybrid retrieval settings: per-leg top-k, fused top-k and the reciprocal rank fusion constant
+VECTOR_TOP_K = int(os.environ.get("ASK_VECTOR_TOP_K", 10))
+TEXT_TOP_K = int(os.environ.get("ASK_TEXT_TOP_K", 10))
+FUSED_TOP_K = int(os.environ.get("ASK_FUSED_TOP_K", 10))
+RRF_K = int(os.environ.get("ASK_RRF_K", 60))
+# Token budgets for the search results of all sub-queries and for the answers given to the final answer
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("ASK_CONTEXT_TOKEN_BUDGET", 12_000))
+ANSWERS_TOKEN_BUDGET = int(os.environ.get("ASK_ANSWERS_TOKEN_BUDGET", 8_000))
+
 
 class SubGraphState(TypedDict):
     question: str
     term: str
     instructions: str
+    search_results: list
     results: dict
     answer: str
 
@@ -41,114 +55,114 @@ class Strategy(BaseModel):
 class ThreadState(TypedDict):
     question: str
     strategy: Strategy
+    search_results: List[list]
     answers: Annotated[list, operator.add]
     final_answer: str
 
 
-def vector_search(
-        keyword: str,
-        results: int,
+async def ahybrid_search_many(
+        keywords: List[str],
+        vector_results: int = VECTOR_TOP_K,
+        text_results: int = TEXT_TOP_K,
+        results: int = FUSED_TOP_K,
         source: bool = True,
         insights: bool = True,
         minimum_score: float = 0.2,
-):
+        rrf_k: int = RRF_K,
+) -> List[list]:
+    """
+    Hybrid lexical and vector search for several keywords.
+
+    For each keyword, the top vector_results documents by vector similarity and the
+    top text_results documents by full-text relevance are fused with reciprocal rank
+    fusion, and the best results documents are returned. If full-text search is not
+    available, the vector results are used alone.
+    Returns one list of search results per keyword, in input order.
+    """
+    collection_fields = _search_collection_fields(source, insights)
+    unique_keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+    if not collection_fields or not unique_keywords:
+        return [[] for _ in keywords]
+
+    vector_store = get_vector_store()
+    all_vector_results, *all_text_results = await asyncio.gather(
+        _avector_search_raw(unique_keywords, collection_fields, vector_results, minimum_score),
+        *[
+            vector_store.atext_search_collections(collection_fields, keyword, text_results)
+            for keyword in unique_keywords
+        ],
+        return_exceptions=True,
+    )
+    if isinstance(all_vector_results, BaseException):
+        raise all_vector_results
+
+    results_by_keyword = {}
+    for keyword, vector_ranking, text_ranking in zip(unique_keywords, all_vector_results, all_text_results):
+        if isinstance(text_ranking, BaseException):
+            logger.warning(f"Full-text search failed, using vector search only: {str(text_ranking)}")
+            text_ranking = []
+        fused = reciprocal_rank_fusion([vector_ranking, text_ranking], k=rrf_k)
+        results_by_keyword[keyword] = _to_search_results(fused[:results])
+    return [list(results_by_keyword.get(keyword, [])) for keyword in keywords]
+
+
+def reciprocal_rank_fusion(rankings: List[list], k: int = RRF_K) -> list:
     """
-    Perform a vector search in the database to find relevant documents.
-
-    This function searches the 'source_embedding' and 'source_insight' collections
-    within the database for documents that are similar to the given keyword by
-    utilizing vector embeddings.
-
-    Parameters:
-    ----------
-    keyword : str
-        The term to search for in the database.
-    results : int
-        The maximum number of results to return for each collection.
-    source : bool, optional
-        Whether to search in the 'source_embedding' collection.
-    insights : bool, optional
-        Whether to search in the 'source_insight' collection.
-    minimum_score : float, optional
-        The minimum score threshold to consider a result as relevant. Only results
-        with a score equal to or greater than this value will be returned.
-
-    Returns:
-    -------
-    list
-        A list of search results that exceed the minimum score threshold,
-        composed of SourceEmbedding and SourceInsight objects.
+    Fuse ranked lists of search results with reciprocal rank fusion. Results are
+    identified by collection and _id, and get the fused score as "score".
     """
-    if not keyword:
-        return []
+    fused = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, 1):
+            key = (result["collection"], str(result["_id"]))
+            if key not in fused:
+                fused[key] = [0.0, result]
+            fused[key][0] += 1 / (k + rank)
+    return [
+        {**result, "score": score}
+        for score, result in sorted(fused.values(), key=lambda x: x[0], reverse=True)
+    ]
 
+
+async def _avector_search_raw(
+        unique_keywords: List[str],
+        collection_fields: dict,
+        results: int,
+        minimum_score: float,
+) -> List[list]:
     EMBEDDING_MODEL = model_manager.embedding_model
-    embed = EMBEDDING_MODEL.embed(keyword)
+    embeds = await EMBEDDING_MODEL.aembed_many(unique_keywords)
+    vector_store = get_vector_store()
+    return await asyncio.gather(*[
+        vector_store.asearch_collections(
+            collection_fields,
+            embed,
+            results,
+            num_candidates=15 * results,
+            minimum_score=minimum_score,
+        )
+        for embed in embeds
+    ])
+
+
+def _search_collection_fields(source: bool, insights: bool) -> dict:
+    collection_fields = {}
+    if source:
+        collection_fields[SourceEmbedding.table_name] = ["content", "source_id", "updated", "created"]
+    if insights:
+        collection_fields[SourceInsight.table_name] = ["insight_type", "content", "source_id", "updated", "created"]
+    return collection_fields
+
+
+def _to_search_results(results: list) -> list:
     search_results = []
-    with db_connection() as db:
-        if source:
-            collection = db["source_embedding"]
-            for result in collection.aggregate([
-                {
-                    '$vectorSearch': {
-                        'index': 'vector_knn_index',
-                        'path': 'embedding',
-                        'queryVector': embed,
-                        'numCandidates': 15 * results,
-                        'limit': results,
-                    }
-                },
-                {
-                    '$project': {
-                        '_id': 1,
-                        'content': 1,
-                        'source_id': 1,
-                        'updated': 1,
-                        'created': 1,
-                        'score': {
-                            '$meta': 'vectorSearchScore'
-                        }
-                    }
-                }
-            ]):
-                if result["score"] >= minimum_score:
-                    score = result["score"]
-                    del result["score"]
-                    search_results.append((score, SourceEmbedding(**result)))
-
-        if insights:
-            collection = db["source_insight"]
-            for result in collection.aggregate([
-                {
-                    '$vectorSearch': {
-                        'index': 'vector_knn_index',
-                        'path': 'embedding',
-                        'queryVector': embed,
-                        'numCandidates': 15 * results,
-                        'limit': results,
-                    }
-                },
-                {
-                    '$project': {
-                        '_id': 1,
-                        'insight_type': 1,
-                        'content': 1,
-                        'source_id': 1,
-                        'updated': 1,
-                        'created': 1,
-                        'score': {
-                            '$meta': 'vectorSearchScore'
-                        }
-                    }
-                }
-            ]):
-                if result["score"] >= minimum_score:
-                    score = result["score"]
-                    del result["score"]
-                    search_results.append((score, SourceInsight(**result)))
-
-    search_results.sort(key=lambda x: x[0], reverse=True)
-    search_results = [result[1] for result in search_results[:results]]
+    for result in results:
+        result.pop("score")
+        collection_name = result.pop("collection")
+        if collection_name == SourceEmbedding.table_name:
+            search_results.append(SourceEmbedding(**result))
+        else:
+            search_results.append(SourceInsight(**result))
     return search_results
 
 
@@ -168,6 +182,74 @@ async def call_model_with_messages(state: ThreadState, config: RunnableConfig) -
     return {"strategy": ai_message}
 
 
+async def retrieve(state: ThreadState, config: RunnableConfig) -> dict:
+    """ Search the notes for every search term of the strategy at once. """
+    configurable = config.get("configurable", {})
+    terms = [search.term for search in state["strategy"].searches]
+    search_results = await ahybrid_search_many(
+        terms,
+        vector_results=configurable.get("vector_top_k", VECTOR_TOP_K),
+        text_results=configurable.get("text_top_k", TEXT_TOP_K),
+        results=configurable.get("fused_top_k", FUSED_TOP_K),
+    )
+    search_results = deduplicate_search_results(search_results)
+    search_results = pack_search_results(
+        search_results,
+        configurable.get("context_token_budget", CONTEXT_TOKEN_BUDGET),
+    )
+    return {"search_results": search_results}
+
+
+def deduplicate_search_results(search_results: List[list]) -> List[list]:
+    """
+    Keep each document, identified by id or by content hash, only in the search
+    where it ranks highest, so that no content is sent to the LLM twice.
+    """
+    best_search = {}
+    for search_index, results in enumerate(search_results):
+        for rank, result in enumerate(results):
+            for key in _dedup_keys(result):
+                if key not in best_search or rank < best_search[key][1]:
+                    best_search[key] = (search_index, rank)
+
+    deduplicated = []
+    seen = set()
+    for search_index, results in enumerate(search_results):
+        kept = []
+        for rank, result in enumerate(results):
+            keys = _dedup_keys(result)
+            if seen.intersection(keys) or any(best_search[key] != (search_index, rank) for key in keys):
+                continue
+            seen.update(keys)
+            kept.append(result)
+        deduplicated.append(kept)
+    return deduplicated
+
+
+def _dedup_keys(result) -> tuple:
+    content_hash = hashlib.sha256(" ".join(result.content.split()).encode("utf-8")).hexdigest()
+    return (f"{result.table_name}:{result.id}", f"content:{content_hash}")
+
+
+def pack_search_results(search_results: List[list], token_budget: int) -> List[list]:
+    """
+    Select search results up to token_budget tokens of content in total. Results are
+    taken rank by rank across all searches so that every search keeps its best hits.
+    """
+    packed = [[] for _ in search_results]
+    used_tokens = 0
+    for rank in range(max((len(results) for results in search_results), default=0)):
+        for search_index, results in enumerate(search_results):
+            if rank >= len(results):
+                continue
+            tokens = token_count(results[rank].content)
+            if used_tokens + tokens > token_budget:
+                continue
+            used_tokens += tokens
+            packed[search_index].append(results[rank])
+    return packed
+
+
 async def trigger_queries(state: ThreadState, config: RunnableConfig):
     return [
         Send(
@@ -176,16 +258,17 @@ async def trigger_queries(state: ThreadState, config: RunnableConfig):
                 "question": state["question"],
                 "instructions": s.instructions,
                 "term": s.term,
+                "search_results": search_results,
             },
         )
-        for s in state["strategy"].searches
+        for s, search_results in zip(state["strategy"].searches, state["search_results"])
     ]
 
 
 async def provide_answer(state: SubGraphState, config: RunnableConfig) -> dict:
     """ Answer to the instruction based on search results. """
     payload = state
-    results = vector_search(state["term"], 10, True, True)
+    results = state["search_results"]
     if len(results) == 0:
         return {"answers": []}
     payload_result = []
@@ -214,7 +297,17 @@ async def provide_answer(state: SubGraphState, config: RunnableConfig) -> dict:
 
 async def write_final_answer(state: ThreadState, config: RunnableConfig) -> dict:
     """ Answer to the question based on instruction answers. """
-    system_prompt = Prompter(prompt_template="ask/final_answer").render(data=state)
+    token_budget = config.get("configurable", {}).get("answers_token_budget", ANSWERS_TOKEN_BUDGET)
+    answers = []
+    used_tokens = 0
+    for answer in state["answers"]:
+        tokens = token_count(answer)
+        if used_tokens + tokens > token_budget:
+            logger.warning(f"Dropping a search answer of {tokens} tokens to stay within the token budget")
+            continue
+        used_tokens += tokens
+        answers.append(answer)
+    system_prompt = Prompter(prompt_template="ask/final_answer").render(data={**state, "answers": answers})
     model = provision_langchain_model(
         system_prompt,
         config.get("configurable", {}).get("final_answer_model"),
@@ -227,10 +320,12 @@ async def write_final_answer(state: ThreadState, config: RunnableConfig) -> dict
 
 agent_state = StateGraph(ThreadState)
 agent_state.add_node("agent", call_model_with_messages)
+agent_state.add_node("retrieve", retrieve)
 agent_state.add_node("provide_answer", provide_answer)
 agent_state.add_node("write_final_answer", write_final_answer)
 agent_state.add_edge(START, "agent")
-agent_state.add_conditional_edges("agent", trigger_queries, ["provide_answer"])
+agent_state.add_edge("agent", "retrieve")
+agent_state.add_conditional_edges("retrieve", trigger_queries, ["provide_answer"])
 agent_state.add_edge("provide_answer", "write_final_answer")
 agent_state.add_edge("write_final_answer", END)
 
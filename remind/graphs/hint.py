@@ -1,3 +1,4 @@
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 from typing_extensions import TypedDict
@@ -16,13 +17,14 @@ class HintState(TypedDict):
 def give_hint(state: HintState, config: RunnableConfig) -> dict:
     """ Give a hint for the current question based on the content. """
     system_prompt = Prompter(prompt_template="quiz/give_hint").render(data=state)
+    payload = [SystemMessage(content=system_prompt), HumanMessage(content=state["content"])]
     model = provision_langchain_model(
-        system_prompt,
+        payload,
         config.get("configurable", {}).get("quiz_model"),
         "tools",
         max_tokens=2000,
     )
-    ai_message = model.invoke(system_prompt)
+    ai_message = model.invoke(payload)
     return {"output": ai_message.content}
 
 
@@ -1,3 +1,4 @@
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers.pydantic import PydanticOutputParser
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
@@ -24,13 +25,14 @@ def judge_answer(state: JudgeState, config: RunnableConfig) -> dict:
     """ Judge whether the answer is correct or not based on the given model answer. """
     parser = PydanticOutputParser(pydantic_object=Correctness)
     system_prompt = Prompter(prompt_template="quiz/judge_answer", parser=parser).render(data=state)
+    payload = [SystemMessage(content=system_prompt), HumanMessage(content=state["content"])]
     model = provision_langchain_model(
-        system_prompt,
+        payload,
         config.get("configurable", {}).get("quiz_model"),
         "tools",
         max_tokens=50,
     )
-    ai_message = (model | parser).invoke(system_prompt)
+    ai_message = (model | parser).invoke(payload)
     return {"output": ai_message}
 
 
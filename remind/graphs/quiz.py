@@ -1,3 +1,4 @@
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers.pydantic import PydanticOutputParser
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
@@ -24,13 +25,15 @@ class QuizState(TypedDict):
 def question_answer_raw(state: QuizState, config: RunnableConfig) -> dict:
     """ Get question and answer pairs for a given content in raw text form. """
     system_prompt = Prompter(prompt_template="quiz/question_ans_raw").render(data=state)
+    # The content is a message of its own, so that its token count is shared with the other quiz graphs
+    payload = [SystemMessage(content=system_prompt), HumanMessage(content=state["content"])]
     model = provision_langchain_model(
-        system_prompt,
+        payload,
         config.get("configurable", {}).get("quiz_model"),
         "tools",
         max_tokens=5000,
     )
-    ai_message = model.invoke(system_prompt)
+    ai_message = model.invoke(payload)
     return {"question_answer_raw": ai_message.content}
 
 def question_answer_json(state: QuizState, config: RunnableConfig) -> dict:
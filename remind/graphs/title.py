@@ -20,7 +20,7 @@ def run_title(state: dict, config: RunnableConfig) -> dict:
     system_prompt = Prompter(prompt_template="title").render(data=state)
     payload = [SystemMessage(content=system_prompt)] + [HumanMessage(content=content)]
     chain = provision_langchain_model(
-        str(payload),
+        payload,
         config.get("configurable", {}).get("model_id"),
         "transformation",
         max_tokens=5000,
@@ -32,7 +32,7 @@ def run_topics(state: dict, config: RunnableConfig) -> dict:
     user_prompt = Prompter(prompt_template="topics").render(data=state)
     payload = [HumanMessage(content=user_prompt)]
     chain = provision_langchain_model(
-        str(payload),
+        payload,
         config.get("configurable", {}).get("model_id"),
         "transformation",
         max_tokens=5000,
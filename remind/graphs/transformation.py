@@ -41,7 +41,7 @@ def run_transformation(state: dict, config: RunnableConfig) -> dict:
     system_prompt = Prompter(prompt_text=transformation_prompt_text).render(data=state)
     payload = [SystemMessage(content=system_prompt)] + [HumanMessage(content=content)]
     chain = provision_langchain_model(
-        str(payload),
+        payload,
         config.get("configurable", {}).get("model_id"),
         "transformation",
         max_tokens=5000,
@@ -1,12 +1,61 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
 from loguru import logger
 from remind.domain.models import model_manager
 from remind.models.llms import LanguageModel
 
+LARGE_CONTEXT_THRESHOLD = 105_000
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+_token_count_cache: OrderedDict[str, int] = OrderedDict()
+_token_count_cache_lock = threading.Lock()
+_TOKEN_COUNT_CACHE_SIZE = 1024
+# Long texts are counted in pieces of this many characters so that counting can stop early
+_TOKEN_COUNT_PIECE_SIZE = 50_000
+
+
+def get_encoding():
+    """
+    Get the 'o200k_base' tiktoken encoding, loaded once per process.
+    """
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                import tiktoken
+
+                _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+
+def _content_hash(input_string: str) -> str:
+    return hashlib.blake2b(input_string.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _split_pieces(input_string: str):
+    """ Split text into pieces of about _TOKEN_COUNT_PIECE_SIZE characters at whitespace. """
+    start = 0
+    while start < len(input_string):
+        end = start + _TOKEN_COUNT_PIECE_SIZE
+        if end < len(input_string):
+            whitespace = input_string.rfind(" ", start, end)
+            if whitespace > start:
+                end = whitespace
+        yield input_string[start:end]
+        start = end
+
 
 def token_count(input_string) -> int:
     """
     Count the number of tokens in the input string using the 'o200k_base' encoding.
+    Counts are cached by content hash.
 
     Args:
         input_string (str): The input string to count tokens for.
@@ -14,33 +63,86 @@ def token_count(input_string) -> int:
     Returns:
         int: The number of tokens in the input string.
     """
-    import tiktoken
+    content_hash = _content_hash(input_string)
+    with _token_count_cache_lock:
+        if content_hash in _token_count_cache:
+            _token_count_cache.move_to_end(content_hash)
+            return _token_count_cache[content_hash]
 
-    encoding = tiktoken.get_encoding("o200k_base")
-    tokens = encoding.encode(input_string)
-    token_count = len(tokens)
+    token_count = len(get_encoding().encode(input_string, disallowed_special=()))
+
+    with _token_count_cache_lock:
+        _token_count_cache[content_hash] = token_count
+        while len(_token_count_cache) > _TOKEN_COUNT_CACHE_SIZE:
+            _token_count_cache.popitem(last=False)
     return token_count
 
+
+def exceeds_token_count(content, limit: int) -> bool:
+    """
+    Check whether content has more than limit tokens, counting no more than needed.
+
+    Content is a string or a list of messages. Cached counts are used when available.
+    A text of at most limit UTF-8 bytes cannot exceed limit tokens, so it is not
+    tokenized at all; longer texts are tokenized piece by piece until the limit is crossed.
+    """
+    if isinstance(content, str):
+        texts = [content]
+    else:
+        texts = [
+            message.content if isinstance(message, BaseMessage) else message
+            for message in content
+        ]
+        texts = [text if isinstance(text, str) else str(text) for text in texts]
+
+    # Each token spans at least one byte
+    if sum(len(text.encode("utf-8", "surrogatepass")) for text in texts) <= limit:
+        return False
+
+    tokens = 0
+    for text in texts:
+        with _token_count_cache_lock:
+            cached = _token_count_cache.get(_content_hash(text))
+        if cached is not None:
+            tokens += cached
+        elif len(text) <= _TOKEN_COUNT_PIECE_SIZE:
+            tokens += token_count(text)
+        else:
+            for piece in _split_pieces(text):
+                tokens += token_count(piece)
+                if tokens > limit:
+                    return True
+        if tokens > limit:
+            return True
+    return False
+
+
+def select_model_id(content, model_id, default_type) -> Optional[str]:
+    """
+    Returns the id of the model provision_langchain_model uses for content.
+    If context > 105_000 tokens, the large_context_model
+    If model_id is specified in Config, that model
+    Otherwise, the default model for the given type
+    """
+    if exceeds_token_count(content, LARGE_CONTEXT_THRESHOLD):
+        logger.debug(
+            f"Using large context model because the content has more than {LARGE_CONTEXT_THRESHOLD} tokens"
+        )
+        return model_manager.get_default_model_id("large_context")
+    if model_id:
+        return model_id
+    return model_manager.get_default_model_id(default_type)
+
+
 def provision_langchain_model(
     content, model_id, default_type, **kwargs
 ) -> BaseChatModel:
     """
     Returns the best model to use based on the context size and on whether there is a specific model being requested in Config.
-    If context > 105_000, returns the large_context_model
-    If model_id is specified in Config, returns that model
-    Otherwise, returns the default model for the given type
+    See select_model_id for how the model is chosen.
+    Content is the prompt string or the list of messages that will be sent to the model.
     """
-    tokens = token_count(content)
-
-    if tokens > 105_000:
-        logger.debug(
-            f"Using large context model because the content has {tokens} tokens"
-        )
-        model = model_manager.get_default_model("large_context", **kwargs)
-    elif model_id:
-        model = model_manager.get_model(model_id, **kwargs)
-    else:
-        model = model_manager.get_default_model(default_type, **kwargs)
+    model = model_manager.get_model(select_model_id(content, model_id, default_type), **kwargs)
 
     assert isinstance(model, LanguageModel), f"Model is not a LanguageModel: {model}"
     return model.to_langchain()
@@ -0,0 +1,150 @@
+"""
+Decoding of audio and video files to 16 kHz mono PCM for speech to text models.
+
+Files are decoded once, in memory, and segments are handed to the models as NumPy arrays.
+"""
+
+import os
+import struct
+import subprocess
+import threading
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+SAMPLE_RATE = 16000
+
+# Detect speech with voice activity detection and leave silence out of transcription
+STT_VAD = os.environ.get("STT_VAD", "true").lower() in ("1", "true", "yes")
+# Pauses shorter than this are kept inside a speech region
+STT_VAD_MIN_SILENCE_MS = int(os.environ.get("STT_VAD_MIN_SILENCE_MS", 500))
+# Audio kept on both sides of a speech region, so that words are not clipped
+STT_VAD_SPEECH_PAD_MS = int(os.environ.get("STT_VAD_SPEECH_PAD_MS", 200))
+
+
+def _wav_pcm_memmap(file_path: str) -> np.ndarray:
+    """
+    Memory-map the samples of a 16 kHz mono 16-bit PCM WAV file.
+    Raises ValueError for any other kind of file.
+    """
+    with open(file_path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError("Not a WAV file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("WAV file has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(chunk_size - 16 + chunk_size % 2, 1)
+            elif chunk_id == b"data":
+                offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)
+
+    # (format tag, channels, sample rate, byte rate, block align, bits per sample)
+    if fmt is None or fmt[0] != 1 or fmt[1] != 1 or fmt[2] != SAMPLE_RATE or fmt[5] != 16:
+        raise ValueError("WAV file is not 16 kHz mono 16-bit PCM")
+    file_size = Path(file_path).stat().st_size
+    num_samples = min(chunk_size, file_size - offset) // 2
+    return np.memmap(file_path, dtype="<i2", mode="r", offset=offset, shape=(num_samples,))
+
+
+def load_audio(file_path: str) -> np.ndarray:
+    """
+    Decode an audio or video file to 16 kHz mono 16-bit PCM samples.
+    WAV files already in that format are memory-mapped, anything else is decoded by ffmpeg to its stdout.
+    """
+    try:
+        return _wav_pcm_memmap(file_path)
+    except (ValueError, struct.error):
+        pass
+
+    ffmpeg_command = [
+        "ffmpeg", "-nostdin", "-v", "error", "-i", str(file_path),
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-acodec", "pcm_s16le", "-",
+    ]
+    process = subprocess.run(ffmpeg_command, capture_output=True, check=True)
+    return np.frombuffer(process.stdout, dtype="<i2")
+
+
+def to_float32(samples: np.ndarray) -> np.ndarray:
+    """ Convert 16-bit PCM samples to floats between -1 and 1, as expected by the ASR models. """
+    return samples.astype(np.float32) / 32768.0
+
+
+def split_audio(samples: np.ndarray, segment_seconds: float) -> Iterator[np.ndarray]:
+    """ Split PCM samples into consecutive segments of at most segment_seconds, as float32 arrays. """
+    segment_length = int(segment_seconds * SAMPLE_RATE)
+    for start in range(0, len(samples), segment_length):
+        yield to_float32(samples[start:start + segment_length])
+
+
+_vad_model = None
+_vad_lock = threading.Lock()
+
+
+def speech_regions(samples: np.ndarray) -> List[Tuple[int, int]]:
+    """ Find the (start, end) sample ranges containing speech with the Silero VAD model, on CPU. """
+    from silero_vad import get_speech_timestamps, load_silero_vad
+
+    global _vad_model
+    # The model keeps state between audio windows, so it is used by one thread at a time
+    with _vad_lock:
+        if _vad_model is None:
+            _vad_model = load_silero_vad()
+        timestamps = get_speech_timestamps(
+            torch.from_numpy(to_float32(samples)),
+            _vad_model,
+            sampling_rate=SAMPLE_RATE,
+            min_silence_duration_ms=STT_VAD_MIN_SILENCE_MS,
+            speech_pad_ms=STT_VAD_SPEECH_PAD_MS,
+        )
+    return [(timestamp["start"], timestamp["end"]) for timestamp in timestamps]
+
+
+def pack_speech(samples: np.ndarray, regions: List[Tuple[int, int]], segment_seconds: float) -> Iterator[np.ndarray]:
+    """
+    Pack consecutive speech regions into segments of at most segment_seconds, as float32 arrays.
+    Segments are cut between regions, and only regions longer than a segment are cut inside.
+    """
+    segment_length = int(segment_seconds * SAMPLE_RATE)
+    pieces = []
+    length = 0
+    for start, end in regions:
+        for piece_start in range(start, end, segment_length):
+            piece_end = min(piece_start + segment_length, end)
+            if pieces and length + piece_end - piece_start > segment_length:
+                yield to_float32(np.concatenate(pieces))
+                pieces = []
+                length = 0
+            pieces.append(samples[piece_start:piece_end])
+            length += piece_end - piece_start
+    if pieces:
+        yield to_float32(np.concatenate(pieces))
+
+
+def speech_segments(samples: np.ndarray, segment_seconds: float, vad: Optional[bool] = None) -> Iterator[np.ndarray]:
+    """
+    Split PCM samples into segments of at most segment_seconds for transcription.
+    With voice activity detection, segments hold only speech and are cut at pauses.
+    """
+    if STT_VAD if vad is None else vad:
+        return pack_speech(samples, speech_regions(samples), segment_seconds)
+    return split_audio(samples, segment_seconds)
+
+
+def encode_flac(segment: np.ndarray) -> bytes:
+    """ Losslessly compress a float32 segment to FLAC in memory, for uploading to transcription APIs. """
+    ffmpeg_command = [
+        "ffmpeg", "-nostdin", "-v", "error", "-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "-",
+        "-acodec", "flac", "-sample_fmt", "s16", "-f", "flac", "-",
+    ]
+    process = subprocess.run(ffmpeg_command, input=segment.astype("<f4").tobytes(), capture_output=True, check=True)
+    return process.stdout
@@ -0,0 +1,265 @@
+"""
+Content-addressed cache for embeddings, keyed by embedding model and text hash
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+from pymongo import UpdateOne
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def cache_key(model_id: str, text: str) -> str:
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_id}:{text_hash}"
+
+
+class EmbeddingStore(ABC):
+    """
+    Abstract base class for the persistent tier of the embedding cache.
+    """
+
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MongoEmbeddingStore(EmbeddingStore):
+    """
+    Embedding store backed by a MongoDB collection.
+    """
+
+    def __init__(self, collection_name: str = "embedding_cache", max_entries: int = 1_000_000):
+        self.collection_name = collection_name
+        self.max_entries = max_entries
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        from remind.database.mongodb import collection_bulk_write, collection_query
+
+        documents = collection_query(self.collection_name, {"_id": {"$in": keys}})
+        if documents:
+            collection_bulk_write(self.collection_name, [
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"accessed": time.time()}})
+                for doc in documents
+            ])
+        return {doc["_id"]: doc["embedding"] for doc in documents}
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        from remind.database.mongodb import collection_bulk_write
+
+        now = time.time()
+        collection_bulk_write(self.collection_name, [
+            UpdateOne({"_id": key}, {"$set": {"embedding": embedding, "accessed": now}}, upsert=True)
+            for key, embedding in items.items()
+        ])
+        self._evict()
+
+    def _evict(self) -> None:
+        from remind.database.mongodb import db_connection
+
+        with db_connection() as db:
+            collection = db[self.collection_name]
+            excess = collection.estimated_document_count() - self.max_entries
+            if excess <= 0:
+                return
+            oldest = collection.find({}, {"_id": 1}).sort("accessed", 1).limit(excess)
+            result = collection.delete_many({"_id": {"$in": [doc["_id"] for doc in oldest]}})
+            logger.debug(f"Evicted {result.deleted_count} cached embeddings")
+
+    def clear(self) -> None:
+        from remind.database.mongodb import db_connection
+
+        with db_connection() as db:
+            db[self.collection_name].delete_many({})
+
+
+class DiskEmbeddingStore(EmbeddingStore):
+    """
+    Embedding store backed by a local SQLite file. Embeddings are stored as float32.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache "
+            "(key TEXT PRIMARY KEY, embedding BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embedding_cache_accessed ON embedding_cache (accessed)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        result = {}
+        with self._lock:
+            # Stay under SQLite's limit of host parameters per statement
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    result[key] = array("f", blob).tolist()
+            if result:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in result],
+                )
+                self._conn.commit()
+        return result
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, embedding, accessed) VALUES (?, ?, ?)",
+                [(key, array("f", embedding).tobytes(), now) for key, embedding in items.items()],
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embedding_cache WHERE key IN "
+                    "(SELECT key FROM embedding_cache ORDER BY accessed ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._conn.commit()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-memory LRU in front of an optional persistent store.
+    """
+
+    def __init__(self, max_entries: int = 10_000, store: Optional[EmbeddingStore] = None):
+        self.max_entries = max_entries
+        self.store = store
+        self._memory: OrderedDict[str, List[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["EmbeddingCache"]:
+        """
+        Create the cache configured by EMBEDDING_CACHE (off, memory, mongo or disk).
+        """
+        backend = os.environ.get("EMBEDDING_CACHE", "memory").lower()
+        max_entries = int(os.environ.get("EMBEDDING_CACHE_SIZE", 10_000))
+        store_max_entries = int(os.environ.get("EMBEDDING_CACHE_STORE_SIZE", 1_000_000))
+        if backend in ("off", "none", "false", "0"):
+            return None
+        if backend == "mongo":
+            store = MongoEmbeddingStore(max_entries=store_max_entries)
+        elif backend == "disk":
+            store = DiskEmbeddingStore(
+                os.environ.get("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3"),
+                max_entries=store_max_entries,
+            )
+        else:
+            store = None
+        return cls(max_entries=max_entries, store=store)
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """ Look up keys, returning only the cached ones. """
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            self._stats["memory_hits"] += len(found)
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing and self.store:
+            try:
+                stored = self.store.get_many(missing)
+            except Exception as e:
+                logger.warning(f"Embedding cache store lookup failed: {str(e)}")
+                stored = {}
+            with self._lock:
+                for key, embedding in stored.items():
+                    self._remember(key, embedding)
+                self._stats["store_hits"] += len(stored)
+            found.update(stored)
+
+        with self._lock:
+            self._stats["misses"] += len([key for key in dict.fromkeys(keys) if key not in found])
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, embedding in items.items():
+                self._remember(key, embedding)
+        if items and self.store:
+            try:
+                self.store.set_many(items)
+            except Exception as e:
+                logger.warning(f"Embedding cache store write failed: {str(e)}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.store:
+            self.store.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["store_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_initialized = False
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """ Get the process-wide embedding cache, or None if it is disabled. """
+    global _embedding_cache, _embedding_cache_initialized
+    if not _embedding_cache_initialized:
+        with _embedding_cache_lock:
+            if not _embedding_cache_initialized:
+                _embedding_cache = EmbeddingCache.from_env()
+                _embedding_cache_initialized = True
+    return _embedding_cache
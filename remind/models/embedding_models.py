@@ -4,14 +4,17 @@ Classes for supporting different embedding models
 
 from __future__ import annotations
 
+import asyncio
 import os
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import List, Optional
 
 import requests
+import tenacity
 
-# TODO: add support for multiple embeddings (array)
+from remind.models.embedding_cache import cache_key, get_embedding_cache
 
 
 @dataclass
@@ -21,12 +24,88 @@ class EmbeddingModel(ABC):
     """
 
     model_name: Optional[str] = None
+    batch_size: int = 64
+    max_workers: int = 4
 
-    @abstractmethod
     def embed(self, text: str) -> List[float]:
         """
         Generates an embedding
         """
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generates embeddings for a list of texts, in input order.
+        Cached embeddings are reused; the remaining texts are sent in batches of
+        batch_size and failed batches are retried.
+        """
+        if not texts:
+            return []
+        cache = get_embedding_cache()
+        if cache is None:
+            return self._embed_uncached(texts)
+
+        keys = [cache_key(self.cache_id, text) for text in texts]
+        cached = cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            embeddings = self._embed_uncached(list(missing.values()))
+            new_embeddings = dict(zip(missing.keys(), embeddings))
+            cache.set_many(new_embeddings)
+            cached.update(new_embeddings)
+        return [cached[key] for key in keys]
+
+    async def aembed(self, text: str) -> List[float]:
+        """
+        Generates an embedding without blocking the event loop
+        """
+        return (await self.aembed_many([text]))[0]
+
+    async def aembed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generates embeddings for a list of texts without blocking the event loop.
+        The blocking HTTP calls of embed_many run in a worker thread.
+        """
+        return await asyncio.to_thread(self.embed_many, texts)
+
+    @property
+    def cache_id(self) -> str:
+        """
+        Identifies the embedding model in embedding cache keys
+        """
+        return f"{self.__class__.__name__}:{self.model_name}"
+
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        batches = [
+            texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            return self._embed_batch_with_retry(batches[0])
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(self._embed_batch_with_retry, batches)
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(3),
+        wait=tenacity.wait_exponential(min=1, max=10),
+        reraise=True,
+    )
+    def _embed_batch_with_retry(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.embed_batch(texts)
+        if len(embeddings) != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} embeddings but got {len(embeddings)}"
+            )
+        return embeddings
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generates embeddings for one batch of texts with a single request
+        """
         raise NotImplementedError
 
 
@@ -35,34 +114,36 @@ class OllamaEmbeddingModel(EmbeddingModel):
     model_name: str
     base_url: str = os.environ.get("OLLAMA_API_BASE", "http://localhost:11434")
 
-    def embed(self, text: str) -> List[float]:
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
         """
-        Embeds the content using Open AI embedding
+        Embeds the content using Ollama embedding
         """
-        text = text.replace("\n", " ")
+        texts = [text.replace("\n", " ") for text in texts]
         response = requests.post(
             f"{self.base_url}/api/embed",
-            json={"model": self.model_name, "input": [text]},
+            json={"model": self.model_name, "input": texts},
         )
-        return response.json()["embeddings"][0]
+        response.raise_for_status()
+        return response.json()["embeddings"]
 
 
 @dataclass
 class GeminiEmbeddingModel(EmbeddingModel):
     model_name: str
+    batch_size: int = 100
 
-    def embed(self, text: str) -> List[float]:
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
         import google.generativeai as genai
 
         """
-        Embeds the content using Open AI embedding
+        Embeds the content using Gemini embedding
         """
         model_name = (
             self.model_name
             if self.model_name.startswith("models/")
             else f"models/{self.model_name}"
         )
-        result = genai.embed_content(model=model_name, content=text)
+        result = genai.embed_content(model=model_name, content=texts)
 
         return result["embedding"]
 
@@ -70,26 +151,28 @@ class GeminiEmbeddingModel(EmbeddingModel):
 @dataclass
 class VertexEmbeddingModel(EmbeddingModel):
     model_name: str
+    # Vertex AI limits a request to 250 inputs and 20k tokens
+    batch_size: int = 16
 
-    def embed(self, text: str) -> List[float]:
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
         from vertexai.language_models import (TextEmbeddingInput,
                                               TextEmbeddingModel)
 
-        texts = [text]
         # The dimensionality of the output embeddings.
         # dimensionality = 256
         # The task type for embedding. Check the available tasks in the model's documentation.
         model = TextEmbeddingModel.from_pretrained(self.model_name)
         inputs = [TextEmbeddingInput(text) for text in texts]
         embeddings = model.get_embeddings(inputs)
-        return embeddings[0].values
+        return [embedding.values for embedding in embeddings]
 
 
 @dataclass
 class OpenAIEmbeddingModel(EmbeddingModel):
     model_name: str
+    batch_size: int = 256
 
-    def embed(self, text: str) -> List[float]:
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
         from openai import OpenAI
 
         """
@@ -97,9 +180,6 @@ class OpenAIEmbeddingModel(EmbeddingModel):
         """
         # todo: make this Singleton
         client = OpenAI()
-        text = text.replace("\n", " ")
-        return (
-            client.embeddings.create(input=[text], model=self.model_name)
-            .data[0]
-            .embedding
-        )
+        texts = [text.replace("\n", " ") for text in texts]
+        response = client.embeddings.create(input=texts, model=self.model_name)
+        return [data.embedding for data in sorted(response.data, key=lambda x: x.index)]
@@ -3,10 +3,12 @@ Classes for supporting different language models
 """
 
 import os
+import threading
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from typing import Any, Dict, Optional
 
+import httpx
 from langchain_anthropic import ChatAnthropic
 from langchain_community.chat_models import ChatLiteLLM
 from langchain_core.language_models.chat_models import BaseChatModel
@@ -20,6 +22,35 @@ from pydantic import SecretStr
 
 # future: is there a value on returning langchain specific models?
 
+_SHARED_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+_shared_http_client: Optional[httpx.Client] = None
+_shared_http_async_client: Optional[httpx.AsyncClient] = None
+_shared_http_client_lock = threading.Lock()
+
+
+def shared_http_client() -> httpx.Client:
+    """
+    Get the keep-alive HTTP client shared by the chat models whose SDKs accept an httpx client.
+    """
+    global _shared_http_client
+    if _shared_http_client is None:
+        with _shared_http_client_lock:
+            if _shared_http_client is None:
+                _shared_http_client = httpx.Client(limits=_SHARED_HTTP_LIMITS)
+    return _shared_http_client
+
+
+def shared_http_async_client() -> httpx.AsyncClient:
+    """
+    Get the keep-alive async HTTP client used by the same chat models for ainvoke and astream.
+    """
+    global _shared_http_async_client
+    if _shared_http_async_client is None:
+        with _shared_http_client_lock:
+            if _shared_http_async_client is None:
+                _shared_http_async_client = httpx.AsyncClient(limits=_SHARED_HTTP_LIMITS)
+    return _shared_http_async_client
+
 
 @dataclass
 class LanguageModel(ABC):
@@ -34,11 +65,30 @@ class LanguageModel(ABC):
     top_p: Optional[float] = 0.9
     kwargs: Dict[str, Any] = field(default_factory=dict)
     json: bool = False
+    _langchain_model: Optional[BaseChatModel] = field(default=None, init=False, repr=False, compare=False)
+    _langchain_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
 
-    @abstractmethod
     def to_langchain(self) -> BaseChatModel:
         """
         Convert the language model to a LangChain chat model.
+        The chat model is created once and reused, so its HTTP connections stay alive between calls.
+        """
+        if self._langchain_model is None:
+            with self._langchain_lock:
+                if self._langchain_model is None:
+                    self._langchain_model = self._create_langchain()
+        return self._langchain_model
+
+    def clear_langchain_cache(self) -> None:
+        """
+        Drop the cached LangChain chat model.
+        """
+        self._langchain_model = None
+
+    @abstractmethod
+    def _create_langchain(self) -> BaseChatModel:
+        """
+        Create the LangChain chat model.
         """
         raise NotImplementedError
 
@@ -54,7 +104,7 @@ class OllamaLanguageModel(LanguageModel):
     max_tokens: Optional[int] = 650
     json: bool = False
 
-    def to_langchain(self) -> ChatOllama:
+    def _create_langchain(self) -> ChatOllama:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -80,7 +130,7 @@ class VertexAnthropicLanguageModel(LanguageModel):
     project: Optional[str] = os.environ.get("VERTEX_PROJECT", "no-project")
     location: Optional[str] = os.environ.get("VERTEX_LOCATION", "us-central1")
 
-    def to_langchain(self) -> ChatAnthropicVertex:
+    def _create_langchain(self) -> ChatAnthropicVertex:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -104,7 +154,7 @@ class LiteLLMLanguageModel(LanguageModel):
 
     model_name: str
 
-    def to_langchain(self) -> ChatLiteLLM:
+    def _create_langchain(self) -> ChatLiteLLM:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -127,7 +177,7 @@ class VertexAILanguageModel(LanguageModel):
     project: Optional[str] = os.environ.get("VERTEX_PROJECT", "no-project")
     location: Optional[str] = os.environ.get("VERTEX_LOCATION", "us-central1")
 
-    def to_langchain(self) -> ChatVertexAI:
+    def _create_langchain(self) -> ChatVertexAI:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -151,7 +201,7 @@ class GeminiLanguageModel(LanguageModel):
 
     model_name: str
 
-    def to_langchain(self) -> ChatGoogleGenerativeAI:
+    def _create_langchain(self) -> ChatGoogleGenerativeAI:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -170,7 +220,7 @@ class OpenRouterLanguageModel(LanguageModel):
 
     model_name: str
 
-    def to_langchain(self) -> ChatOpenAI:
+    def _create_langchain(self) -> ChatOpenAI:
         """
         Convert the language model to a LangChain chat model for Open Router.
         """
@@ -179,6 +229,8 @@ class OpenRouterLanguageModel(LanguageModel):
             kwargs["response_format"] = {"type": "json_object"}
 
         return ChatOpenAI(
+            http_client=shared_http_client(),
+            http_async_client=shared_http_async_client(),
             model=self.model_name,
             temperature=self.temperature or 0.5,
             base_url=os.environ.get(
@@ -200,7 +252,7 @@ class GroqLanguageModel(LanguageModel):
 
     model_name: str
 
-    def to_langchain(self) -> ChatGroq:
+    def _create_langchain(self) -> ChatGroq:
         """
         Convert the language model to a LangChain chat model for Groq.
         """
@@ -208,6 +260,8 @@ class GroqLanguageModel(LanguageModel):
         kwargs["top_p"] = self.top_p
 
         return ChatGroq(
+            http_client=shared_http_client(),
+            http_async_client=shared_http_async_client(),
             model=self.model_name,
             temperature=self.temperature or 0.5,
             max_tokens=self.max_tokens,
@@ -224,7 +278,7 @@ class XAILanguageModel(LanguageModel):
 
     model_name: str
 
-    def to_langchain(self) -> ChatOpenAI:
+    def _create_langchain(self) -> ChatOpenAI:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -233,6 +287,8 @@ class XAILanguageModel(LanguageModel):
             kwargs["response_format"] = {"type": "json_object"}
 
         return ChatOpenAI(
+            http_client=shared_http_client(),
+            http_async_client=shared_http_async_client(),
             model=self.model_name,
             temperature=self.temperature or 0.5,
             base_url=os.environ.get("XAI_BASE_URL", "https://api.x.ai/v1"),
@@ -252,7 +308,7 @@ class AnthropicLanguageModel(LanguageModel):
 
     model_name: str
 
-    def to_langchain(self) -> ChatAnthropic:
+    def _create_langchain(self) -> ChatAnthropic:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -275,7 +331,7 @@ class OpenAILanguageModel(LanguageModel):
 
     model_name: str
 
-    def to_langchain(self) -> ChatOpenAI:
+    def _create_langchain(self) -> ChatOpenAI:
         """
         Convert the language model to a LangChain chat model.
         """
@@ -285,6 +341,8 @@ class OpenAILanguageModel(LanguageModel):
             kwargs["response_format"] = {"type": "json_object"}
 
         return ChatOpenAI(
+            http_client=shared_http_client(),
+            http_async_client=shared_http_async_client(),
             model=self.model_name,
             temperature=self.temperature or 0.5,
             streaming=self.streaming,
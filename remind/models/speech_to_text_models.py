@@ -3,13 +3,36 @@ Classes for supporting different transcription models
 """
 
 import gc
-import tempfile
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
 
+import numpy as np
+import tenacity
 import torch
-from pydub import AudioSegment
+from loguru import logger
+
+from .audio import SAMPLE_RATE, encode_flac, load_audio, speech_segments
+
+# Seconds a loaded Parakeet model stays in memory without being used
+PARAKEET_IDLE_TIMEOUT = float(os.environ.get("PARAKEET_IDLE_TIMEOUT", 600))
+# Longest audio, in seconds, transcribed together in one forward pass. Short segments are
+# batched up to this total; the default is one full segment, to fit consumer GPUs
+PARAKEET_BATCH_SECONDS = float(os.environ.get("PARAKEET_BATCH_SECONDS", 450))
+# Length of the segments long audio is split into for Parakeet
+PARAKEET_SEGMENT_SECONDS = 450
+
+# Segments uploaded to a transcription API at the same time
+STT_API_CONCURRENCY = int(os.environ.get("STT_API_CONCURRENCY", 4))
+# Largest upload accepted by the transcription APIs, in MB
+STT_API_MAX_UPLOAD_MB = float(os.environ.get("STT_API_MAX_UPLOAD_MB", 24))
+# Uploaded segments stay under the size limit even uncompressed (16-bit samples)
+STT_API_SEGMENT_SECONDS = min(600, STT_API_MAX_UPLOAD_MB * 1e6 / (2 * SAMPLE_RATE))
 
 
 @dataclass
@@ -27,75 +50,218 @@ class SpeechToTextModel(ABC):
         """
         raise NotImplementedError
 
+    def transcribe_stream(self, audio_file_path: str) -> Iterator[str]:
+        """
+        Generates the transcription of consecutive segments of the audio, as each one is transcribed
+        """
+        yield self.transcribe(audio_file_path)
 
-@dataclass
-class OpenAISpeechToTextModel(SpeechToTextModel):
-    model_name: str
-
-    def transcribe(self, audio_file_path: str) -> str:
+    def partial_transcripts(self, audio_file_path: str) -> Iterator[str]:
         """
-        Transcribes an audio file into text
+        Yields the transcript so far each time a segment has been transcribed
         """
-        from openai import OpenAI
+        texts = []
+        for text in self.transcribe_stream(audio_file_path):
+            if text:
+                texts.append(text)
+                yield " ".join(texts)
+
+
+@lru_cache(maxsize=None)
+def _openai_client():
+    from openai import OpenAI
 
-        # todo: make this Singleton
-        client = OpenAI()
-        with open(audio_file_path, "rb") as audio:
-            transcription = client.audio.transcriptions.create(
-                model=self.model_name, file=audio
-            )
-            return transcription.text
+    return OpenAI()
+
+
+@lru_cache(maxsize=None)
+def _groq_client():
+    from groq import Groq
+
+    return Groq()
 
 
 @dataclass
-class GroqSpeechToTextModel(SpeechToTextModel):
-    model_name: str
+class APISpeechToTextModel(SpeechToTextModel):
+    """
+    Speech to text model behind a transcription API.
+    Long audio is uploaded in size-bounded segments at the same time, and their transcripts are returned in order.
+    """
+
+    @abstractmethod
+    def client(self):
+        """ Client of the transcription API, shared by all transcriptions. """
+        raise NotImplementedError
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(3),
+        wait=tenacity.wait_exponential(min=2, max=30),
+        reraise=True,
+    )
+    def _transcribe_segment(self, segment: np.ndarray) -> str:
+        transcription = self.client().audio.transcriptions.create(
+            model=self.model_name, file=("segment.flac", encode_flac(segment))
+        )
+        return transcription.text.strip()
 
     def transcribe(self, audio_file_path: str) -> str:
         """
         Transcribes an audio file into text
         """
-        from groq import Groq
+        return " ".join(self.transcribe_stream(audio_file_path))
 
-        # todo: make this Singleton
-        client = Groq()
-        with open(audio_file_path, "rb") as audio:
-            transcription = client.audio.transcriptions.create(
-                model=self.model_name, file=audio
-            )
-            return transcription.text
+    def transcribe_stream(self, audio_file_path: str) -> Iterator[str]:
+        """
+        Transcribes an audio file segment by segment, yielding the segments in order
+        """
+        samples = load_audio(audio_file_path)
+        segments = speech_segments(samples, STT_API_SEGMENT_SECONDS)
+        with ThreadPoolExecutor(max_workers=STT_API_CONCURRENCY) as executor:
+            yield from executor.map(self._transcribe_segment, segments)
 
 
 @dataclass
-class ParakeetSpeechToTextModel(SpeechToTextModel):
+class OpenAISpeechToTextModel(APISpeechToTextModel):
     model_name: str
 
-    def transcribe(self, audio_file_path: str) -> str:
-        """
-        Transcribes an audio file into text
-        """
+    def client(self):
+        return _openai_client()
+
+
+@dataclass
+class GroqSpeechToTextModel(APISpeechToTextModel):
+    model_name: str
+
+    def client(self):
+        return _groq_client()
+
+
+class ResidentASRModel:
+    """
+    NeMo ASR model that is loaded on first use and kept in memory between transcriptions.
+    It is unloaded after idle_timeout seconds without use to free (GPU) memory.
+    """
+
+    def __init__(self, model_name: str, idle_timeout: float = PARAKEET_IDLE_TIMEOUT):
+        self.model_name = model_name
+        self.idle_timeout = idle_timeout
+        self._model = None
+        # Serializes transcriptions, including the load of the model on first use
+        self._transcribe_lock = threading.Lock()
+        # Guards the model and the idle state; only held briefly, so the unload timer never waits on a load
+        self._state_lock = threading.Lock()
+        self._busy = False
+        self._last_used = 0.0
+        self._unload_timer: Optional[threading.Timer] = None
+
+    def _load(self):
         import nemo.collections.asr as nemo_asr
-        asr_model = nemo_asr.models.ASRModel.from_pretrained(model_name="nvidia/parakeet-tdt-0.6b-v2")
 
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            # Split the audio file into segments as the audio file maybe too long
-            audio = AudioSegment.from_file(audio_file_path)
-            segment_length = 450000  # 450 seconds in milliseconds
-            segment_files = []
+        logger.info(f"Loading ASR model {self.model_name}")
+        return nemo_asr.models.ASRModel.from_pretrained(model_name=self.model_name)
+
+    def transcribe(self, audio: List[Any]) -> List[str]:
+        """
+        Transcribe audio files or 16 kHz mono float32 arrays in one batched forward pass.
+        Calls are serialized, as the model is not safe to run from several threads.
+        """
+        with self._transcribe_lock:
+            with self._state_lock:
+                if self._unload_timer is not None:
+                    self._unload_timer.cancel()
+                self._busy = True
+                model = self._model
+            try:
+                if model is None:
+                    model = self._load()
+                    with self._state_lock:
+                        self._model = model
+                outputs = model.transcribe(audio, batch_size=len(audio))
+            finally:
+                with self._state_lock:
+                    self._busy = False
+                    self._last_used = time.monotonic()
+                    self._schedule_unload()
+        return [output.text for output in outputs]
 
-            for i, segment in enumerate(audio[::segment_length]):
-                segment_file_path = f"{tmp_dir}/segment_{i}.mp3"
-                segment.export(segment_file_path, format="mp3")
-                segment_files.append(segment_file_path)
+    def _schedule_unload(self) -> None:
+        if self.idle_timeout <= 0:
+            return
+        self._unload_timer = threading.Timer(self.idle_timeout, self._unload_if_idle)
+        self._unload_timer.daemon = True
+        self._unload_timer.start()
 
-            all_transcripts = []
-            for segment_file in segment_files:
-                output = asr_model.transcribe([segment_file])
-                all_transcripts.append(output[0].text)
+    def _unload_if_idle(self) -> None:
+        with self._state_lock:
+            if self._busy or time.monotonic() - self._last_used < self.idle_timeout:
+                return
+        self.unload()
 
-        del asr_model
+    def unload(self) -> None:
+        with self._state_lock:
+            if self._model is None or self._busy:
+                return
+            self._model = None
+        logger.info(f"Unloading idle ASR model {self.model_name}")
         gc.collect()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
-        return " ".join(all_transcripts)
+
+def _batches_by_duration(segments: Iterator[np.ndarray], max_seconds: float) -> Iterator[List[np.ndarray]]:
+    """ Group consecutive segments into batches of at most max_seconds of audio, with at least one segment each. """
+    batch = []
+    duration = 0.0
+    for segment in segments:
+        seconds = len(segment) / SAMPLE_RATE
+        if batch and duration + seconds > max_seconds:
+            yield batch
+            batch = []
+            duration = 0.0
+        batch.append(segment)
+        duration += seconds
+    if batch:
+        yield batch
+
+
+_asr_models: Dict[str, ResidentASRModel] = {}
+_asr_models_lock = threading.Lock()
+
+
+def get_resident_asr_model(model_name: str) -> ResidentASRModel:
+    """ Get the process-wide resident ASR model for model_name. """
+    with _asr_models_lock:
+        if model_name not in _asr_models:
+            _asr_models[model_name] = ResidentASRModel(model_name)
+        return _asr_models[model_name]
+
+
+@dataclass
+class ParakeetSpeechToTextModel(SpeechToTextModel):
+    model_name: str
+
+    @property
+    def asr_model(self) -> ResidentASRModel:
+        return get_resident_asr_model(self.model_name or "nvidia/parakeet-tdt-0.6b-v2")
+
+    def transcribe(self, audio_file_path: str) -> str:
+        """
+        Transcribes an audio file into text
+        """
+        return " ".join(self.transcribe_stream(audio_file_path))
+
+    def transcribe_stream(self, audio_file_path: str) -> Iterator[str]:
+        """
+        Transcribes an audio file segment by segment, yielding the segments in order
+        """
+        # Split the audio at pauses as it may be too long to transcribe at once
+        samples = load_audio(audio_file_path)
+        segments = speech_segments(samples, PARAKEET_SEGMENT_SECONDS)
+        first_segment = next(segments, None)
+        if first_segment is None:
+            return
+        # The first segment is transcribed alone so that the transcript starts to show quickly.
+        # With the default PARAKEET_BATCH_SECONDS, every later batch is a single segment too.
+        yield from self.asr_model.transcribe([first_segment])
+        for batch in _batches_by_duration(segments, PARAKEET_BATCH_SECONDS):
+            yield from self.asr_model.transcribe(batch)
@@ -17,6 +17,9 @@ from docling_litellm_picture_description.datamodel.pipeline_options import \
 
 from remind.prompter import Prompter
 
+# Pictures of a document described at the same time by the vision model during conversion
+PICTURE_DESCRIPTION_CONCURRENCY = int(os.environ.get("PICTURE_DESCRIPTION_CONCURRENCY", 8))
+
 
 @dataclass
 class VisionModel(ABC):
@@ -65,6 +68,9 @@ class OllamaVisionModel(VisionModel):
             prompt=Prompter(prompt_template="image_description").render(data={}),
             scale=1.0,
             timeout=120,
+            concurrency=PICTURE_DESCRIPTION_CONCURRENCY,
+            # Docling hands pictures to the model in batches, so a batch must fill the concurrency
+            batch_size=max(8, PICTURE_DESCRIPTION_CONCURRENCY),
         )
 
     def picture_description(self, image_path: str) -> str:
@@ -94,6 +100,8 @@ class LiteLLMVisionModel(VisionModel):
             prompt=Prompter(prompt_template="image_description").render(data={}),
             scale=1.0,
             timeout=120,
+            concurrency=PICTURE_DESCRIPTION_CONCURRENCY,
+            batch_size=max(8, PICTURE_DESCRIPTION_CONCURRENCY),
         )
 
     def picture_description(self, image_path: str) -> str:
@@ -0,0 +1,93 @@
+"""
+Pool of warm docling DocumentConverters, so that layout, OCR and picture description
+models are loaded once instead of for every converted file.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from loguru import logger
+
+from remind.domain.models import model_manager
+from remind.models.vision_models import VisionModel
+
+# Converters are not shared between concurrent conversions, so this caps parallel conversions too
+DOCLING_CONVERTERS = int(os.environ.get("DOCLING_CONVERTERS", 1))
+
+
+def build_document_converter(vision_model: Optional[VisionModel]) -> DocumentConverter:
+    """ Build a DocumentConverter describing pictures with vision_model, and load its PDF pipeline. """
+    pipeline_options = PdfPipelineOptions(
+        enable_remote_services=True,
+        allow_external_plugins=True,
+        do_picture_description=vision_model is not None,
+        generate_picture_images=True,
+    )
+    if vision_model is not None:
+        pipeline_options.picture_description_options = vision_model.picture_description_options()
+    converter = DocumentConverter(
+        format_options={
+            InputFormat.IMAGE: PdfFormatOption(
+                pipeline_options=pipeline_options,
+            ),
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_options=pipeline_options,
+            )
+        }
+    )
+    converter.initialize_pipeline(InputFormat.PDF)
+    return converter
+
+
+class DocumentConverterPool:
+    """
+    Up to size DocumentConverters built with the same configuration.
+    Each converter is used by one thread at a time and kept warm between conversions.
+    """
+
+    def __init__(self, key: str, factory: Callable[[], DocumentConverter], size: int = DOCLING_CONVERTERS):
+        self.key = key
+        self._factory = factory
+        self._idle: queue.SimpleQueue = queue.SimpleQueue()
+        self._available = threading.Semaphore(max(1, size))
+
+    @contextmanager
+    def converter(self) -> Iterator[DocumentConverter]:
+        """ Borrow a converter, waiting if all of them are in use. """
+        with self._available:
+            try:
+                converter = self._idle.get_nowait()
+            except queue.Empty:
+                logger.info("Loading document converter")
+                converter = self._factory()
+            try:
+                yield converter
+            finally:
+                self._idle.put(converter)
+
+
+_pool: Optional[DocumentConverterPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_document_converter_pool() -> DocumentConverterPool:
+    """
+    Get the converter pool for the default vision model.
+    The pool is replaced when the default vision model changes.
+    """
+    global _pool
+    vision_model = model_manager.vision_model
+    # Model dataclasses show all of their configuration in their repr
+    key = repr(vision_model)
+    with _pool_lock:
+        if _pool is None or _pool.key != key:
+            if _pool is not None:
+                logger.info("Vision model changed, replacing document converters")
+            _pool = DocumentConverterPool(key, lambda: build_document_converter(vision_model))
+        return _pool
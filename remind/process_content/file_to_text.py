@@ -1,22 +1,143 @@
+import multiprocessing
+import os
 import re
-import subprocess
 import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, List, Optional, Tuple
 
 import gradio as gr
+import pypdfium2
 from docling.datamodel.base_models import FormatToExtensions, InputFormat
-from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling_core.types.doc.document import PictureDescriptionData
+from docling_core.types.doc.document import (DoclingDocument,
+                                             PictureDescriptionData,
+                                             PictureItem)
 from PIL import Image
 
 from remind.domain.models import model_manager
 
+from .document_converter import get_document_converter_pool
 from .upload_image import upload_image
 
 VIDEO_EXTENSIONS = set(('webm', 'mkv', 'flv', 'vob', 'ogv', 'ogg', 'rrc', 'gifv', 'mng', 'mov', 'avi', 'qt', 'wmv', 'yuv', 'rm', 'asf', 'amv', 'mp4', 'm4p', 'm4v', 'mpg', 'mp2', 'mpeg', 'mpe', 'mpv', 'm4v', 'svi', '3gp', '3g2', 'mxf', 'roq', 'nsv', 'flv', 'f4v', 'f4p', 'f4a', 'f4b', 'mod'))
 IMAGE_EXTENSIONS = set(FormatToExtensions[InputFormat.IMAGE])
+SUPPORTED_EXTENSIONS = set(sum(FormatToExtensions.values(), [])) | VIDEO_EXTENSIONS | {"md", "gif", "avif"}
+IMAGE_PLACEHOLDER = "<!-- image -->"
+
+# Convert PDFs in parts of this many pages, shown as they finish; 0 converts the whole PDF at once.
+# Layout context is lost at part boundaries, so tables or lists across two parts are broken.
+PDF_PAGES_PER_PART = int(os.environ.get("PDF_PAGES_PER_PART", 0))
+# Processes converting parts of a PDF in parallel; 0 converts the parts one by one in this process
+PDF_CONVERT_PROCESSES = int(os.environ.get("PDF_CONVERT_PROCESSES", 0))
+
+# Pictures of a document uploaded at the same time
+IMAGE_UPLOAD_CONCURRENCY = int(os.environ.get("IMAGE_UPLOAD_CONCURRENCY", 8))
+
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+_pdf_process_pool_lock = threading.Lock()
+
+def picture_to_markdown(pic: PictureItem) -> str:
+    """ Markdown image of a converted picture, captioned with its picture descriptions. """
+    if not pic.image:
+        return ""
+    annotation_text = []
+    for annotation in pic.annotations:
+        if not isinstance(annotation, PictureDescriptionData):
+            continue
+        annotation_text.append(annotation.text)
+    annotation_text = "\n".join(annotation_text)
+    annotation_text = re.sub(r"\n+", "\n", annotation_text)
+    image_link = upload_image(pic.image.pil_image)
+    return f"![{annotation_text}]({image_link})"
+
+def document_to_markdown(doc: DoclingDocument) -> str:
+    """ Export a converted document to markdown, replacing the picture placeholders in a single pass. """
+    markdown_text = doc.export_to_markdown(include_annotations=False)
+    pieces = markdown_text.split(IMAGE_PLACEHOLDER)
+    # The n-th placeholder belongs to the n-th picture; placeholders without a picture are dropped
+    # Pictures are uploaded concurrently, and map keeps them in document order
+    with ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_CONCURRENCY) as executor:
+        pictures = list(executor.map(picture_to_markdown, doc.pictures[:len(pieces) - 1]))
+    pictures += [""] * (len(pieces) - len(pictures))
+    return "".join(piece + picture for piece, picture in zip(pieces, pictures))
+
+def convert_document(file, page_range: Optional[Tuple[int, int]] = None) -> str:
+    """ Convert a document, or the 1-based inclusive page_range of a PDF, to markdown with docling. """
+    kwargs = {} if page_range is None else dict(page_range=page_range)
+    with get_document_converter_pool().converter() as converter:
+        doc = converter.convert(file, **kwargs).document
+    return document_to_markdown(doc)
+
+def get_pdf_process_pool() -> Optional[ProcessPoolExecutor]:
+    """ Get the process pool converting parts of PDFs, or None if PDF_CONVERT_PROCESSES is 0. """
+    global _pdf_process_pool
+    if PDF_CONVERT_PROCESSES <= 0:
+        return None
+    with _pdf_process_pool_lock:
+        if _pdf_process_pool is None:
+            # Spawned processes do not inherit the threads and model state of this process
+            _pdf_process_pool = ProcessPoolExecutor(
+                max_workers=PDF_CONVERT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_process_pool
+
+def pdf_page_ranges(file) -> List[Tuple[int, int]]:
+    """
+    Split the pages of a PDF into 1-based inclusive ranges of PDF_PAGES_PER_PART pages.
+    Returns no ranges when PDFs are not split.
+    """
+    if PDF_PAGES_PER_PART <= 0:
+        return []
+    pdf = pypdfium2.PdfDocument(file)
+    try:
+        page_count = len(pdf)
+    finally:
+        pdf.close()
+    return [
+        (start, min(start + PDF_PAGES_PER_PART - 1, page_count))
+        for start in range(1, page_count + 1, PDF_PAGES_PER_PART)
+    ]
+
+def stream_pdf_to_text(file) -> Iterator[str]:
+    """
+    Convert a PDF part by part, on the PDF process pool if there is one.
+    Yields the markdown converted so far, in page order, each time the next part is done.
+    """
+    page_ranges = pdf_page_ranges(file)
+    if len(page_ranges) <= 1:
+        yield convert_document(file)
+        return
+
+    process_pool = get_pdf_process_pool()
+    if process_pool is None:
+        parts = (convert_document(file, page_range) for page_range in page_ranges)
+    else:
+        futures = [process_pool.submit(convert_document, file, page_range) for page_range in page_ranges]
+        parts = (future.result() for future in futures)
+
+    markdown_parts = []
+    try:
+        for part in parts:
+            markdown_parts.append(part)
+            yield "\n\n".join(markdown_parts)
+    finally:
+        if process_pool is not None:
+            for future in futures:
+                future.cancel()
+
+def file_to_text_stream(file, additional_files: Optional[list] = None) -> Iterator[str]:
+    """
+    Convert file to markdown, yielding the partial markdown of PDFs as their pages are converted
+    and the partial transcript of videos as their segments are transcribed.
+    """
+    if Path(file).suffix.lower() == ".pdf":
+        yield from stream_pdf_to_text(file)
+    elif Path(file).suffix.lstrip(".").lower() in VIDEO_EXTENSIONS:
+        yield from video_to_text_stream(file)
+    else:
+        yield file_to_text(file, additional_files)
 
 def file_to_text(file, additional_files: Optional[list] = None) -> str:
     """ Convert file to markdown. """
@@ -42,39 +163,14 @@ def file_to_text(file, additional_files: Optional[list] = None) -> str:
             img = Image.open(file)
             img.convert("RGB").save(tmp_png_path)
             return file_to_text(tmp_png_path)
+    # PDF file
+    if Path(file).suffix.lower() == ".pdf":
+        markdown_text = ""
+        for markdown_text in stream_pdf_to_text(file):
+            pass
+        return markdown_text
     # Others
-    pipeline_options = PdfPipelineOptions(
-        enable_remote_services=True,
-        allow_external_plugins=True,
-        do_picture_description=True,
-        picture_description_options=model_manager.vision_model.picture_description_options(),
-        generate_picture_images=True,
-    )
-    converter = DocumentConverter(
-        format_options={
-            InputFormat.IMAGE: PdfFormatOption(
-                pipeline_options=pipeline_options,
-            ),
-            InputFormat.PDF: PdfFormatOption(
-                pipeline_options=pipeline_options,
-            )
-        }
-    )
-    doc = converter.convert(file).document
-    markdown_text = doc.export_to_markdown(include_annotations=False)
-    for pic in doc.pictures:
-        if pic.image:
-            annotation_text = []
-            for annotation in pic.annotations:
-                if not isinstance(annotation, PictureDescriptionData):
-                    continue
-                annotation_text.append(annotation.text)
-            annotation_text = "\n".join(annotation_text)
-            annotation_text = re.sub(r"\n+", "\n", annotation_text)
-            image_link = upload_image(pic.image.pil_image)
-            markdown_text = markdown_text.replace("<!-- image -->", f"![{annotation_text}]({image_link})", 1)
-        else:
-            markdown_text = markdown_text.replace("<!-- image -->", "", 1)
+    markdown_text = convert_document(file)
 
     # If the file is an image and OCR has failed, fallback to using vision model picture description.
     if not markdown_text and Path(file).suffix.lstrip(".").lower() in IMAGE_EXTENSIONS:
@@ -87,14 +183,16 @@ def file_to_text(file, additional_files: Optional[list] = None) -> str:
 
 def video_to_text(video_file):
     """ Transcribe video to text. """
+    transcript = ""
+    for transcript in video_to_text_stream(video_file):
+        pass
+    return transcript
+
+def video_to_text_stream(video_file) -> Iterator[str]:
+    """ Transcribe video to text, yielding the transcript so far as segments are transcribed. """
     STT_MODEL = model_manager.speech_to_text
     if STT_MODEL is None:
         raise gr.Error("Please set up a Speech to Text Model in Models tab.")
 
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        tmp_file_path = f"{tmp_dir}/temp_audio"
-        ffmpeg_command = f"ffmpeg -i {video_file} -vn -ac 1 -acodec libmp3lame {tmp_file_path}.mp3"
-        process = subprocess.run(ffmpeg_command, shell=True, check=True)
-
-        transcript = STT_MODEL.transcribe(tmp_file_path + ".mp3")
-    return transcript
+    # The speech to text model decodes the audio track of the video itself
+    yield from STT_MODEL.partial_transcripts(video_file)
@@ -0,0 +1,308 @@
+"""
+Background ingestion of notes. Jobs are stored in MongoDB and taken by a pool of worker threads,
+so that converting, embedding and transforming a note does not hold up the UI.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+from remind.database.mongodb import collection_count, collection_query
+from remind.domain.jobs import IngestionJob
+from remind.domain.notes import Asset, Source, file_fingerprint
+from remind.domain.transformation import Transformation
+from remind.exceptions import InvalidInputError
+
+from .file_to_text import file_to_text
+from .transform_note import transform_note
+from .url_to_text import url_to_text
+from .youtube_to_text import get_youtube_id, retrieve_youtube_transcript
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))
+INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", 3))
+# Seconds to wait before the first retry of a failed job, doubled on each further retry
+INGEST_RETRY_BACKOFF = float(os.environ.get("INGEST_RETRY_BACKOFF", 30))
+INGEST_POLL_INTERVAL = float(os.environ.get("INGEST_POLL_INTERVAL", 5))
+# Running jobs without a heartbeat for this many seconds are taken over by another worker
+INGEST_STALE_AFTER = float(os.environ.get("INGEST_STALE_AFTER", 600))
+INGEST_UPLOAD_DIR = os.environ.get("INGEST_UPLOAD_DIR", "data/uploads")
+
+
+def store_upload(file_path: str) -> str:
+    """ Copy an uploaded file to the upload directory so that it outlives the request. """
+    upload_dir = Path(INGEST_UPLOAD_DIR)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    stored_path = upload_dir / f"{uuid.uuid4().hex}{Path(file_path).suffix}"
+    shutil.copyfile(file_path, stored_path)
+    return str(stored_path)
+
+
+def convert_input(input_path: Optional[str] = None, url: Optional[str] = None) -> str:
+    """ Convert a file, a YouTube video or a webpage to markdown text. """
+    if input_path:
+        return file_to_text(input_path)
+    if url:
+        if get_youtube_id(url, ignore_playlist=True) != url:
+            return retrieve_youtube_transcript(url)
+        return url_to_text(url)
+    raise InvalidInputError("Nothing to convert: the job has no text, file or URL")
+
+
+def _generate_insights(job: IngestionJob) -> None:
+    """ Generate the title, topics and transformations of the note that the job does not have yet. """
+    transformations: List[Transformation] = Transformation.get_all()
+    generated = {}
+    total = len(transformations) + 2
+    for key, output in transform_note(job.full_text, transformations):
+        if isinstance(output, Exception):
+            raise output
+        generated[key] = output
+        job.set_progress("insights", len(generated) / total * 0.9)
+
+    insights = job.insights or [
+        (transformation.name, generated[i]) for i, transformation in enumerate(transformations)
+    ]
+    job.update_fields(
+        title=job.title or generated["title"],
+        topics=job.topics or generated["topics"],
+        insights=insights,
+        transform=False,
+    )
+
+
+def _remove_upload(job: IngestionJob) -> None:
+    if job.input_path and Path(job.input_path).parent == Path(INGEST_UPLOAD_DIR):
+        Path(job.input_path).unlink(missing_ok=True)
+
+
+def _finish_duplicate(job: IngestionJob, duplicate: Source) -> Source:
+    logger.info(f"Ingestion job {job.id} is a duplicate of source {duplicate.id}, skipping it")
+    job.update_fields(duplicate_of=duplicate.id)
+    job.mark_done()
+    _remove_upload(job)
+    return duplicate
+
+
+def run_ingestion_job(job: IngestionJob) -> Source:
+    """
+    Run the stages of a job: convert, chunk, embed and insights.
+    Stages finished by an earlier attempt are skipped. A job whose file or text
+    matches a saved source is finished without ingesting it again.
+    """
+    if job.input_path and job.asset and not job.asset.file_hash:
+        job.asset.file_hash = file_fingerprint(job.input_path)
+        job.update_fields(**{"asset.file_hash": job.asset.file_hash})
+    if not job.source_id:
+        duplicate = Source.find_duplicate(
+            full_text=job.full_text,
+            file_hash=job.asset.file_hash if job.asset else None,
+        )
+        if duplicate:
+            return _finish_duplicate(job, duplicate)
+
+    if not job.stage_done("convert"):
+        if not job.full_text:
+            job.set_progress("convert", 0.0)
+            asset_url = job.asset.url if job.asset else None
+            full_text = convert_input(job.input_path, asset_url)
+            if not full_text or not full_text.strip():
+                raise InvalidInputError("No text could be extracted")
+            job.update_fields(full_text=full_text)
+        job.set_progress("convert", 1.0)
+        if not job.source_id:
+            duplicate = Source.find_duplicate(full_text=job.full_text)
+            if duplicate:
+                return _finish_duplicate(job, duplicate)
+
+    if job.source_id:
+        source = Source.get(job.source_id)
+    else:
+        source = Source(
+            asset=job.asset,
+            title=job.title,
+            topics=job.topics,
+            full_text=job.full_text,
+        )
+        source.save()
+        job.set_source(source.id)
+
+    if not job.stage_done("embed"):
+        # Drop the chunks saved by an interrupted attempt
+        source.clear_embeddings()
+        source.vectorize(on_progress=job.set_progress)
+        job.set_progress("chunk", 1.0)
+        job.set_progress("embed", 1.0)
+
+    if not job.stage_done("insights"):
+        job.set_progress("insights", 0.0)
+        if job.transform:
+            _generate_insights(job)
+        source.title = job.title
+        source.topics = job.topics
+        source.save()
+        source.clear_insights()
+        insights = [(insight_type, content) for insight_type, content in job.insights if content]
+        if insights:
+            source.add_insights(insights)
+        job.set_progress("insights", 1.0)
+
+    job.mark_done()
+    _remove_upload(job)
+    return source
+
+
+class IngestionWorkerPool:
+    """
+    Worker threads that take queued ingestion jobs from MongoDB and run them.
+    Several processes can run a pool at the same time, since jobs are claimed atomically.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = INGEST_WORKERS,
+        poll_interval: float = INGEST_POLL_INTERVAL,
+        retry_backoff: float = INGEST_RETRY_BACKOFF,
+        stale_after: float = INGEST_STALE_AFTER,
+    ):
+        self.num_workers = max(1, num_workers)
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.stale_after = stale_after
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {self.num_workers} ingestion workers")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            self._stopping.set()
+            self._wakeup.set()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def notify(self) -> None:
+        """ Wake up idle workers to look for new jobs. """
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = IngestionJob.claim_next(self.stale_after)
+            except Exception as e:
+                logger.error(f"Error claiming ingestion job: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._process(job)
+
+    def _heartbeat(self, job: IngestionJob, finished: threading.Event) -> None:
+        while not finished.wait(self.stale_after / 3):
+            try:
+                job.touch()
+            except Exception as e:
+                logger.warning(f"Error refreshing heartbeat of ingestion job {job.id}: {str(e)}")
+
+    def _process(self, job: IngestionJob) -> None:
+        logger.info(f"Running ingestion job {job.id} (attempt {job.attempts})")
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, finished), daemon=True)
+        heartbeat.start()
+        try:
+            run_ingestion_job(job)
+            logger.info(f"Ingestion job {job.id} done")
+        except Exception as e:
+            logger.exception(e)
+            try:
+                job.mark_failed(str(e), self.retry_backoff)
+            except Exception as e:
+                logger.error(f"Error recording failure of ingestion job {job.id}: {str(e)}")
+        finally:
+            finished.set()
+
+
+_workers: Optional[IngestionWorkerPool] = None
+_workers_lock = threading.Lock()
+
+
+def get_ingestion_workers() -> IngestionWorkerPool:
+    """ Get the process-wide ingestion worker pool. It is not started until start_ingestion_workers(). """
+    global _workers
+    if _workers is None:
+        with _workers_lock:
+            if _workers is None:
+                _workers = IngestionWorkerPool()
+    return _workers
+
+
+def start_ingestion_workers() -> IngestionWorkerPool:
+    workers = get_ingestion_workers()
+    workers.start()
+    return workers
+
+
+def submit_ingestion_job(**fields) -> IngestionJob:
+    """ Queue a note for background ingestion and return its job right away. """
+    job = IngestionJob(max_attempts=INGEST_MAX_ATTEMPTS, **fields)
+    job.save()
+    get_ingestion_workers().notify()
+    return job
+
+
+def is_already_ingested(asset: Asset) -> bool:
+    """
+    Check whether a file or URL has been saved as a note or is waiting to be ingested.
+    Files are matched by path and by content hash.
+    """
+    conditions = []
+    if asset.file_path:
+        conditions.append({"asset.file_path": asset.file_path})
+    if asset.file_hash:
+        conditions.append({"asset.file_hash": asset.file_hash})
+    if asset.url:
+        conditions.append({"asset.url": asset.url})
+    if not conditions:
+        return False
+    return bool(
+        collection_count(Source.table_name, {"$or": conditions})
+        or collection_count(IngestionJob.table_name, {
+            "$or": conditions,
+            "status": {"$in": ["queued", "running"]},
+        })
+    )
+
+
+def wait_for_jobs(job_ids: List, poll_interval: float = 1.0) -> List[IngestionJob]:
+    """ Block until every job is done or has failed for good, and return the finished jobs. """
+    remaining = set(job_ids)
+    finished = []
+    while remaining:
+        result = collection_query(IngestionJob.table_name, {
+            "_id": {"$in": list(remaining)},
+            "status": {"$in": ["done", "failed"]},
+        })
+        for job in result:
+            remaining.discard(job["_id"])
+            finished.append(IngestionJob(**job))
+        if remaining:
+            time.sleep(poll_interval)
+    return finished
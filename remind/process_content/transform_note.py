@@ -0,0 +1,91 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from loguru import logger
+
+from remind.domain.models import Model
+from remind.domain.transformation import Transformation
+from remind.graphs.title import graph as title_graph
+from remind.graphs.topics import graph as topics_graph
+from remind.graphs.transformation import graph as transformation_graph
+from remind.graphs.utils import select_model_id
+
+_provider_semaphores: Dict[str, threading.Semaphore] = {}
+_provider_semaphores_lock = threading.Lock()
+
+
+def provider_semaphore(provider: Optional[str]) -> threading.Semaphore:
+    """
+    Get the semaphore capping concurrent LLM calls to a provider.
+    The cap is LLM_MAX_CONCURRENCY_<PROVIDER>, or LLM_MAX_CONCURRENCY (default 4).
+    """
+    provider = provider or "default"
+    with _provider_semaphores_lock:
+        if provider not in _provider_semaphores:
+            env_name = "LLM_MAX_CONCURRENCY_" + provider.upper().replace("-", "_")
+            limit = int(os.environ.get(env_name, os.environ.get("LLM_MAX_CONCURRENCY", 4)))
+            _provider_semaphores[provider] = threading.Semaphore(max(1, limit))
+        return _provider_semaphores[provider]
+
+
+def model_provider(model_id) -> Optional[str]:
+    """ Get the provider of a model, or None when no model is set or it cannot be found. """
+    if not model_id:
+        return None
+    try:
+        return Model.get(model_id).provider
+    except Exception as e:
+        logger.warning(f"Could not look up model {model_id}: {str(e)}")
+        return None
+
+
+def transformation_provider(input_text: str) -> Optional[str]:
+    """
+    Get the provider of the model the transformations of input_text run on.
+    Long notes are sent to the large context model, which may be another provider.
+    """
+    return model_provider(select_model_id(input_text, None, "transformation"))
+
+
+def transform_note(
+    input_text: str,
+    transformations: List[Transformation],
+) -> Generator[Tuple[Any, Any], None, None]:
+    """
+    Generate the title, the topics and every transformation of a note concurrently.
+
+    Yields (key, output) as each generation finishes, where key is "title", "topics"
+    or the index of the transformation. A failed generation yields its exception as output.
+    """
+    # Title, topics and transformations all send the note to the same model, so they share one cap.
+    # A note without a configured model falls back to the default cap.
+    semaphore = provider_semaphore(transformation_provider(input_text))
+
+    def limited(run: Callable[[], Any]) -> Callable[[], Any]:
+        def run_limited():
+            with semaphore:
+                return run()
+        return run_limited
+
+    tasks: Dict[Any, Callable[[], Any]] = {
+        "title": lambda: title_graph.invoke(dict(input_text=input_text))["output"],
+        "topics": lambda: topics_graph.invoke(dict(input_text=input_text))["output"],
+    }
+    for i, transformation in enumerate(transformations):
+        tasks[i] = lambda transformation=transformation: transformation_graph.invoke(dict(
+            input_text=input_text,
+            transformation=transformation,
+        ))["output"]
+
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = {executor.submit(limited(run)): key for key, run in tasks.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result()
+            except Exception as e:
+                logger.error(f"Error generating {key} of note: {str(e)}")
+                logger.exception(e)
+                yield key, e
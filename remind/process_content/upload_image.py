@@ -1,37 +1,129 @@
+"""
+Content-addressed store for the images of notes.
+
+Images are saved once under IMAGE_STORE_DIR, named by the hash of their bytes, and linked
+through the file route of the WebUI. They can also be replicated to imgur in the background.
+"""
+
+import hashlib
+import io
 import os
-import tempfile
+import queue
+import threading
 from pathlib import Path
+from typing import List
 
 import pyimgur
 import tenacity
+from loguru import logger
 from PIL.Image import Image
 
+from remind.database.mongodb import collection_query, collection_upsert
 
-def upload_image(image) -> str:
+IMAGE_STORE_DIR = os.environ.get("IMAGE_STORE_DIR", "data/images")
+# Prefix turning a stored image path into a link served by the WebUI
+IMAGE_STORE_URL_PREFIX = os.environ.get("IMAGE_STORE_URL_PREFIX", "/gradio_api/file=")
+# Remote host images are copied to in the background: "imgur" or "off".
+# Defaults to imgur when imgur credentials are set.
+IMAGE_REPLICATION = (
+    os.environ.get("IMAGE_REPLICATION")
+    or ("imgur" if os.environ.get("IMGUR_CLIENT_ID") and os.environ.get("IMGUR_CLIENT_SECRET") else "off")
+).lower()
+
+IMAGE_REPLICATION_WORKERS = 4
+
+# Replication runs on daemon threads so that pending uploads never hold up the exit of the process.
+# Images not replicated by then keep their local link and are queued again when uploaded next.
+_replication_queue: queue.SimpleQueue = queue.SimpleQueue()
+_replication_threads: List[threading.Thread] = []
+_replication_lock = threading.Lock()
+_replicating = set()
+
+
+def store_image(image) -> Path:
     """
-    Upload an image and return the link.
+    Save a PIL image or an image file in the image store and return its path.
+    Identical images are stored once.
     """
-
     if isinstance(image, Image):
-        tmp_dir = tempfile.TemporaryDirectory()
-        image_path = (Path(tmp_dir.name) / "tmp.png").as_posix()
-        image.save(image_path)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        data, suffix = buffer.getvalue(), ".png"
     else:
-        image_path = image
+        data, suffix = Path(image).read_bytes(), Path(image).suffix.lower()
 
-    image_link = None
-    if os.environ.get("IMGUR_CLIENT_ID") and os.environ.get("IMGUR_CLIENT_SECRET"):
-        image_link = upload_image_to_imgur(image_path)
-    image_link = image_link or image_path
+    image_hash = hashlib.sha256(data).hexdigest()
+    image_path = Path(IMAGE_STORE_DIR) / image_hash[:2] / f"{image_hash}{suffix}"
+    if not image_path.exists():
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary name first so that readers never see a partial file
+        tmp_path = image_path.with_name(f"{image_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(image_path)
+    return image_path
 
-    if isinstance(image, Image):
-        tmp_dir.cleanup()
-    return image_link
+
+def upload_image(image) -> str:
+    """
+    Store an image and return its link: the replicated remote link if there is one already,
+    otherwise the local link, and replication is started in the background.
+    """
+    image_path = store_image(image)
+    if IMAGE_REPLICATION == "off":
+        return local_image_link(image_path)
+
+    replica = collection_query("image_replica", {"_id": image_path.stem})
+    if replica:
+        return replica[0]["url"]
+    replicate_image(image_path)
+    return local_image_link(image_path)
+
+
+def local_image_link(image_path: Path) -> str:
+    return f"{IMAGE_STORE_URL_PREFIX}{image_path.as_posix()}"
+
+
+def replicate_image(image_path: Path) -> None:
+    """ Copy a stored image to the remote host in the background, once. """
+    with _replication_lock:
+        if image_path.stem in _replicating:
+            return
+        _replicating.add(image_path.stem)
+        if len(_replication_threads) < IMAGE_REPLICATION_WORKERS:
+            thread = threading.Thread(
+                target=_replication_worker,
+                name=f"image-replication-{len(_replication_threads)}",
+                daemon=True,
+            )
+            thread.start()
+            _replication_threads.append(thread)
+    _replication_queue.put(image_path)
+
+
+def _replication_worker() -> None:
+    while True:
+        _replicate_image(_replication_queue.get())
+
+
+def _replicate_image(image_path: Path) -> None:
+    try:
+        if IMAGE_REPLICATION == "imgur":
+            url = upload_image_to_imgur(image_path.as_posix())
+        else:
+            logger.warning(f"Unknown image replication target: {IMAGE_REPLICATION}")
+            return
+        collection_upsert("image_replica", {"_id": image_path.stem}, {"url": url, "path": image_path.as_posix()})
+        logger.debug(f"Replicated image {image_path.name} to {url}")
+    except Exception as e:
+        logger.warning(f"Failed to replicate image {image_path.name}: {str(e)}")
+    finally:
+        with _replication_lock:
+            _replicating.discard(image_path.stem)
 
 
 @tenacity.retry(
-    stop=tenacity.stop_after_attempt(3),
-    wait=tenacity.wait_exponential(min=5, max=30),
+    stop=tenacity.stop_after_attempt(3) | tenacity.stop_after_delay(60),
+    wait=tenacity.wait_exponential(min=2, max=10),
     reraise=True,
 )
 def upload_image_to_imgur(image_path: str) -> str:
@@ -2,6 +2,7 @@ import os
 import tempfile
 import uuid
 from contextlib import suppress
+from typing import Iterator
 from urllib.parse import parse_qs, urlparse
 
 import gradio as gr
@@ -57,35 +58,43 @@ def retrieve_youtube_transcript(url: str) -> str:
     return text
 
 
+def get_playlist_video_urls(playlist: str) -> list[str]:
+    """ List the video URLs of a YouTube playlist, given its id or URL. """
+    playlist_id = get_youtube_id(playlist)
+    ydl_opts = {"extract_flat": True, "quiet": True}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(f"https://www.youtube.com/playlist?list={playlist_id}", download=False)
+    return [
+        f"https://www.youtube.com/watch?v={entry['id']}"
+        for entry in info.get("entries") or []
+        if entry and entry.get("id")
+    ]
+
+
 def stt_youtube_audio(url: str) -> str:
     """ Download YouTube Audio and transcribe it with speech to text model. """
+    transcript = ""
+    for transcript in stt_youtube_audio_stream(url):
+        pass
+    return transcript
+
+
+def stt_youtube_audio_stream(url: str) -> Iterator[str]:
+    """ Download YouTube Audio and transcribe it, yielding the transcript so far as segments are transcribed. """
     STT_MODEL = model_manager.speech_to_text
     if STT_MODEL is None:
         raise gr.Error("Please set up a Speech to Text Model in Models tab.")
 
     with tempfile.TemporaryDirectory() as tmp_dir:
-        file_name = f"{uuid.uuid4()}"
-        tmp_file_path = os.path.join(tmp_dir, file_name)
-
-        # Define yt-dlp options
+        # Keep the downloaded audio as it is: the speech to text model decodes it
+        # once, instead of it being re-encoded to MP3 first
         ydl_opts = {
             'format': 'bestaudio/best',
-            'outtmpl': tmp_file_path,  # Save file to temporary path
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '0',
-                'nopostoverwrites': False,
-            }],
-            # Add postprocessor arguments at global level
-            'postprocessor_args': [
-                '-ac', '1'  # Convert to mono
-            ],
+            'outtmpl': os.path.join(tmp_dir, f"{uuid.uuid4()}.%(ext)s"),
         }
 
-        # Use yt-dlp to download and process video
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+            info = ydl.extract_info(url, download=True)
+            audio_file_path = ydl.prepare_filename(info)
 
-        transcript = STT_MODEL.transcribe(tmp_file_path + ".mp3")
-    return transcript
+        yield from STT_MODEL.partial_transcripts(audio_file_path)
@@ -10,8 +10,10 @@ from bokeh.models import (ColumnDataSource, CustomJS, HoverTool, Label,
                           LinearColorMapper, Span, TapTool)
 from bokeh.palettes import YlOrRd as palette
 from bokeh.plotting import figure
+from bson import ObjectId
 
 from remind.database.mongodb import collection_query
+from remind.domain.jobs import IngestionJob
 from remind.domain.notes import Source
 from remind.process_content.text_to_speech import \
     generate_audio_from_transcript
@@ -35,6 +37,9 @@ def create_activity_chart(year: int, topics_filter: list[str]):
         regex_topics_filter = [re.compile(topic, re.IGNORECASE) for topic in topics_filter]
         filter["topics"] = {"$in": regex_topics_filter}
 
+    # Leave out notes that are still being ingested
+    filter["_id"] = {"$nin": IngestionJob.pending_source_ids()}
+
     documents = collection_query("source", filter)
     values = [0] * days_in_year
     note_cnt = [0] * days_in_year
@@ -197,6 +202,28 @@ def natural_sort(l):
     alphanum_key = lambda key: [convert(c) for c in re.split('([0-9]+)', key)]
     return sorted(l, key=alphanum_key)
 
+def pending_job_summaries() -> list[dict]:
+    summaries = []
+    for job in IngestionJob.pending():
+        if job.status == "failed":
+            status = f"Failed: {job.error}"
+        elif job.status == "running" and job.stage:
+            status = f"{job.stage.capitalize()} {job.progress.get(job.stage, 0.0):.0%}"
+        elif job.error:
+            status = f"Queued for retry after error: {job.error}"
+        else:
+            status = job.status.capitalize()
+        summaries.append(dict(id=str(job.id), name=job.display_name, status=status, failed=job.status == "failed"))
+    return summaries
+
+def refresh_pending_jobs(previous: list[dict]):
+    """ Refresh the pending notes, and the calendar when some of them have finished. """
+    current = pending_job_summaries()
+    if current == previous:
+        return gr.skip(), gr.skip()
+    finished = {job["id"] for job in previous or []} - {job["id"] for job in current}
+    return current, datetime.now() if finished else gr.skip()
+
 def calendar_tab(demo, calendar_update):
     with gr.Tab("📅 Calendar"):
         with gr.Row():
@@ -229,6 +256,32 @@ def calendar_tab(demo, calendar_update):
                     note_topics_filter = gr.Dropdown(all_topics, value=topics_filter, multiselect=True, label="Filter by Topics", interactive=True, allow_custom_value=True)
                     note_topics_filter.change(lambda x: x, inputs=[note_topics_filter], outputs=[topics_to_filter])
 
+        # Notes queued for background ingestion
+        pending_jobs = gr.State([])
+        pending_jobs_timer = gr.Timer(5)
+        demo.load(refresh_pending_jobs, inputs=[pending_jobs], outputs=[pending_jobs, calendar_update])
+        pending_jobs_timer.tick(refresh_pending_jobs, inputs=[pending_jobs], outputs=[pending_jobs, calendar_update], show_progress="hidden")
+        calendar_update.change(refresh_pending_jobs, inputs=[pending_jobs], outputs=[pending_jobs, calendar_update], show_progress="hidden")
+
+        @gr.render(inputs=[pending_jobs], triggers=[pending_jobs.change])
+        def render_pending_jobs(jobs: list[dict]):
+            if not jobs:
+                return
+            with gr.Accordion(f"Pending Notes ({len(jobs)})", open=True):
+                for job in jobs:
+                    with gr.Row():
+                        gr.Markdown(f"**{job['name']}** - {job['status']}")
+                        if not job["failed"]:
+                            continue
+                        job_retry_button = gr.Button("Retry", scale=0)
+                        job_delete_button = gr.Button("Delete", scale=0)
+                    job_retry_button.click(lambda job_id=job["id"]: IngestionJob.get(ObjectId(job_id)).retry()).then(
+                        refresh_pending_jobs, inputs=[pending_jobs], outputs=[pending_jobs, calendar_update]
+                    )
+                    job_delete_button.click(lambda job_id=job["id"]: IngestionJob.get(ObjectId(job_id)).delete()).then(
+                        refresh_pending_jobs, inputs=[pending_jobs], outputs=[pending_jobs, calendar_update]
+                    )
+
         calendar = gr.Plot(show_label=False)
         clicked_date = gr.Textbox(label="Clicked Date", elem_id="text_to_update", visible=False)
         demo.load(lambda: datetime.now().year, [], [current_year])
@@ -246,6 +299,7 @@ def calendar_tab(demo, calendar_update):
             if topics_filter:
                 regex_topics_filter = [re.compile(topic, re.IGNORECASE) for topic in topics_filter]
                 filter["topics"] = {"$in": regex_topics_filter}
+            filter["_id"] = {"$nin": IngestionJob.pending_source_ids()}
             notes = collection_query("source", filter)
             notes = [Source(**note) for note in notes]
             for note in notes:
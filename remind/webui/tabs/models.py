@@ -65,6 +65,7 @@ def delete_model(model: Model):
         default_models.update()
         model_manager.refresh_defaults()
     model.delete()
+    model_manager.clear_cache()
     return datetime.now()
 
 def save_default_models(
@@ -3,27 +3,81 @@ from pathlib import Path
 
 import gradio as gr
 
-from remind.domain.notes import Asset, Source
+from remind.domain.notes import Asset, Source, file_fingerprint
 from remind.domain.transformation import Transformation
-from remind.graphs.title import graph as title_graph
-from remind.graphs.topics import graph as topics_graph
-from remind.graphs.transformation import graph as transformation_graph
-from remind.process_content.file_to_text import file_to_text
+from remind.process_content.file_to_text import file_to_text_stream
+from remind.process_content.ingestion import (store_upload,
+                                              submit_ingestion_job)
+from remind.process_content.transform_note import transform_note
 from remind.process_content.url_to_text import (firecrawl_url_to_text,
                                                 is_firecrawl_available,
                                                 url_to_text)
 from remind.process_content.youtube_to_text import (
-    retrieve_youtube_transcript, stt_youtube_audio)
+    retrieve_youtube_transcript, stt_youtube_audio_stream)
 from remind.webui.components.markdown_latex_render import \
     GR_MARKDOWN_LATEX_DELIMITERS
 
 
-def update_file_path(file_path):
+def update_file_path(file_path, additional_files=None):
     file_name = Path(file_path).name
-    return file_name, ""
+    # Linked files change a markdown note, so the note is not identified by the hash of its main file
+    file_hash = "" if additional_files else file_fingerprint(file_path)
+    return file_name, "", file_hash
 
 def update_url(url):
-    return "", url
+    return "", url, ""
+
+def check_duplicate(full_text=None, file_hash=None):
+    duplicate = Source.find_duplicate(full_text=full_text, file_hash=file_hash)
+    if duplicate:
+        raise gr.Error(f"This note has already been saved as \"{duplicate.title}\".")
+
+def convert_file(file, additional_files):
+    """ Convert the file to text, showing the pages of a PDF or the transcript of a video as they are converted. """
+    # Linked files can change a markdown note, so only a lone file is matched by hash
+    if file and not additional_files:
+        check_duplicate(file_hash=file_fingerprint(file))
+    yield from file_to_text_stream(file, additional_files)
+
+def queue_file(file):
+    if not file:
+        raise gr.Error("Please upload a file first.")
+    submit_ingestion_job(
+        input_path=store_upload(file),
+        asset=Asset(file_path=Path(file).name),
+        transform=True,
+    )
+
+def queue_url(url):
+    if not url:
+        raise gr.Error("Please enter a URL first.")
+    submit_ingestion_job(asset=Asset(url=url), transform=True)
+
+def run_transform_note(input_text):
+    """ Generate the title, topics and transformations concurrently, yielding each result as it finishes. """
+    check_duplicate(full_text=input_text)
+    transformations: list[Transformation] = Transformation.get_all()
+    transformed = dict(
+        input_text=input_text,
+        transformations=transformations,
+        title=None,
+        topics=None,
+        transformation_outputs=[None] * len(transformations),
+        done=False,
+    )
+    yield transformed
+    for key, output in transform_note(input_text, transformations):
+        if isinstance(output, Exception):
+            name = transformations[key].name if isinstance(key, int) else key
+            gr.Warning(f"Failed to generate {name}: {output}")
+            output = [] if key == "topics" else ""
+        transformed = dict(transformed, transformation_outputs=list(transformed["transformation_outputs"]))
+        if isinstance(key, int):
+            transformed["transformation_outputs"][key] = output
+        else:
+            transformed[key] = output
+        yield transformed
+    yield dict(transformed, done=True)
 
 def upload_tab(calendar_update):
     with gr.Tab("📤 Upload"):
@@ -32,15 +86,18 @@ def upload_tab(calendar_update):
                 gr.Markdown("1. Convert Note into Text")
                 file_path = gr.State("")
                 url = gr.State("")
+                file_hash = gr.State("")
 
                 with gr.Tabs():
                     with gr.Tab("File"):
                         gr.Markdown("Supports PDF, DOCX, XLSX, PPTX, AsciiDoc, HTML, XHTML, CSV, video file.")
                         file = gr.File()
                         additional_files = gr.File(file_count="multiple", label="Additional Files", visible=False)
-                        file.clear(lambda: ("", ""), outputs=[file_path, url])
+                        file.clear(lambda: ("", "", ""), outputs=[file_path, url, file_hash])
                         file.change(lambda file: gr.File(None, visible=bool(file) and Path(file).suffix == ".md"), inputs=[file], outputs=[additional_files])
-                        file_convert_button = gr.Button("Convert to Text")
+                        with gr.Row():
+                            file_convert_button = gr.Button("Convert to Text")
+                            file_queue_button = gr.Button("Add in Background")
 
                     with gr.Tab("YouTube"):
                         gr.Markdown("If Convert to Text does not work, use STT Convert.")
@@ -48,6 +105,7 @@ def upload_tab(calendar_update):
                         with gr.Row():
                             youtube_convert_button = gr.Button("Convert to Text")
                             youtube_stt_button = gr.Button("STT Convert")
+                            youtube_queue_button = gr.Button("Add in Background")
 
                     with gr.Tab("Webpage"):
                         webpage_url = gr.Textbox(label="Webpage URL")
@@ -55,6 +113,7 @@ def upload_tab(calendar_update):
                             webpage_convert_button = gr.Button("Convert to Text")
                             if is_firecrawl_available():
                                 webpage_firecrawl_convert_button = gr.Button("Firecrawl Convert")
+                            webpage_queue_button = gr.Button("Add in Background")
 
                 with gr.Accordion("Edit Note Content", open=False):
                     note_text = gr.TextArea(label="Note Content", interactive=True, container=False)
@@ -62,75 +121,91 @@ def upload_tab(calendar_update):
                 note_text.change(lambda x: x, inputs=[note_text], outputs=[note_markdown], show_progress=False)
 
                 file_convert_button.click(lambda: gr.Info("Converting file...", duration=2)).then(
-                    file_to_text, inputs=[file, additional_files], outputs=[note_text]
+                    convert_file, inputs=[file, additional_files], outputs=[note_text]
                 ).then(
-                    update_file_path, inputs=[file], outputs=[file_path, url]
+                    update_file_path, inputs=[file, additional_files], outputs=[file_path, url, file_hash]
                 )
 
                 youtube_convert_button.click(lambda: gr.Info("Retrieving transcriptions...", duration=2)).then(
                     retrieve_youtube_transcript, inputs=[youtube_url], outputs=[note_text]
                 ).then(
-                    update_url, inputs=[youtube_url], outputs=[file_path, url]
+                    update_url, inputs=[youtube_url], outputs=[file_path, url, file_hash]
                 )
 
                 youtube_stt_button.click(lambda: gr.Info("STT transcribing...", duration=5)).then(
-                    stt_youtube_audio, inputs=[youtube_url], outputs=[note_text]
+                    stt_youtube_audio_stream, inputs=[youtube_url], outputs=[note_text]
                 ).then(
-                    update_url, inputs=[youtube_url], outputs=[file_path, url]
+                    update_url, inputs=[youtube_url], outputs=[file_path, url, file_hash]
                 )
 
                 webpage_convert_button.click(lambda: gr.Info("Downloading Webpage...", duration=2)).then(
                     url_to_text, inputs=[webpage_url], outputs=[note_text]
                 ).then(
-                    update_url, inputs=[webpage_url], outputs=[file_path, url]
+                    update_url, inputs=[webpage_url], outputs=[file_path, url, file_hash]
                 )
 
+                queued_message = "Queued. The note will be converted, transformed and saved in the background."
+                for queue_button, queue_fn, queue_input in (
+                    (file_queue_button, queue_file, file),
+                    (youtube_queue_button, queue_url, youtube_url),
+                    (webpage_queue_button, queue_url, webpage_url),
+                ):
+                    queue_button.click(queue_fn, inputs=[queue_input]).success(
+                        lambda: datetime.now(), outputs=[calendar_update]
+                    ).then(lambda: gr.Info(queued_message, duration=3))
+
                 if is_firecrawl_available():
                     webpage_firecrawl_convert_button.click(lambda: gr.Info("Firecrawl converting...", duration=2)).then(
                         firecrawl_url_to_text, inputs=[webpage_url], outputs=[note_text]
                     ).then(
-                        update_url, inputs=[webpage_url], outputs=[file_path, url]
+                        update_url, inputs=[webpage_url], outputs=[file_path, url, file_hash]
                     )
 
                 gr.Markdown("2. Transform Note Content")
                 note_transform_button = gr.Button("AI Transform")
-                note_transform_button.click(lambda: gr.Info("Transforming...", duration=5))
+                transformed = gr.State(None)
+                note_transform_button.click(lambda: gr.Info("Transforming...", duration=5)).then(
+                    run_transform_note, inputs=[note_text], outputs=[transformed], show_progress="minimal"
+                )
 
             with gr.Column():
-                @gr.render(inputs=[note_text, file_path, url], triggers=[note_transform_button.click])
-                def transformed_note(input_text, file_path, url):
+                @gr.render(inputs=[transformed, file_path, url, file_hash], triggers=[transformed.change])
+                def transformed_note(transformed, file_path, url, file_hash):
+                    if not transformed:
+                        return
                     gr.Markdown("3. Save Note")
-                    title = title_graph.invoke(dict(input_text=input_text))["output"]
-                    note_title = gr.Textbox(title, label="Title", interactive=True)
-                    all_transformations: list[Transformation] = Transformation.get_all()
+                    done = transformed["done"]
+                    note_title = gr.Textbox(transformed["title"], label="Title", interactive=done, placeholder="Generating...")
+                    all_transformations: list[Transformation] = transformed["transformations"]
                     all_transformation_textareas = []
-                    for transformation in all_transformations:
-                        transformation_output_text = transformation_graph.invoke(dict(
-                            input_text=input_text,
-                            transformation=transformation,
-                        ))["output"]
-                        transformation_output_textarea = gr.TextArea(transformation_output_text, label=transformation.name, interactive=True, info=transformation.description)
+                    for transformation, transformation_output_text in zip(all_transformations, transformed["transformation_outputs"]):
+                        transformation_output_textarea = gr.TextArea(transformation_output_text, label=transformation.name, interactive=done, info=transformation.description, placeholder="Generating...")
                         all_transformation_textareas.append(transformation_output_textarea)
-                    topics = topics_graph.invoke(dict(input_text=input_text))["output"]
-                    note_topics = gr.Dropdown(topics, value=topics, multiselect=True, label="Topics", interactive=True, allow_custom_value=True)
+                    topics = transformed["topics"] or []
+                    note_topics = gr.Dropdown(topics, value=topics, multiselect=True, label="Topics", interactive=done, allow_custom_value=True)
+                    if not done:
+                        return
 
+                    input_text = transformed["input_text"]
                     save_note_button = gr.Button("Save Note")
 
                     def save_note(title, topics, *transformation_texts):
-                        source = Source(
-                            asset=Asset(file_path=file_path, url=url),
+                        check_duplicate(full_text=input_text)
+                        submit_ingestion_job(
+                            asset=Asset(file_path=file_path, url=url, file_hash=file_hash or None),
                             title=title,
                             topics=topics,
                             full_text=input_text,
+                            insights=[
+                                (transformation.name, transformation_text)
+                                for transformation, transformation_text in zip(all_transformations, transformation_texts)
+                                if transformation_text
+                            ],
                         )
-                        source.save()
-                        source.vectorize()
-                        for transformation, transformation_text in zip(all_transformations, transformation_texts):
-                            source.add_insight(transformation.name, transformation_text)
 
-                    save_note_button.click(lambda: gr.Info("Saving...", 2)).then(
+                    save_note_button.click(
                         save_note,
                         inputs=[note_title, note_topics, *all_transformation_textareas],
-                    ).then(
+                    ).success(
                         lambda: datetime.now(), outputs=[calendar_update]
-                    ).then(lambda: gr.Info("Note saved.", duration=2))
+                    ).then(lambda: gr.Info("Note queued. It will appear in Calendar once processed.", duration=3))
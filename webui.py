@@ -5,10 +5,13 @@ import dotenv
 
 dotenv.load_dotenv()
 
+from remind.process_content.ingestion import start_ingestion_workers
+from remind.process_content.upload_image import IMAGE_STORE_DIR
 from remind.webui.ui import get_ui
 
 
 def launch(args):
+    start_ingestion_workers()
     demo = get_ui()
     demo.queue(default_concurrency_limit=None)
     demo.launch(
@@ -17,6 +20,8 @@ def launch(args):
         share=args.share,
         auth=(os.environ.get("GRADIO_USERNAME", "admin"), os.environ.get("GRADIO_PASSWORD", "admin")) if args.share else None,
         favicon_path="assets/brain.png",
+        # Serve the images of notes from the image store
+        allowed_paths=[IMAGE_STORE_DIR],
     )
 
 if __name__ == "__main__":